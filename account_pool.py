@@ -0,0 +1,77 @@
+from cookie_health import get_cookie_monitor
+
+# 账号池目标在账号选择键盘和任务中的标识
+POOL_TARGET = "__pool__"
+
+# 没有观测数据时假定的单个链接耗时（秒）
+DEFAULT_LATENCY = 1.0
+
+# 错误率对权重的惩罚系数
+ERROR_PENALTY = 4.0
+
+# 账号的观测统计：单个链接耗时和错误率的指数移动平均
+class AccountStats:
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+
+    def observe(self, latency, error_rate):
+        if self.latency is None:
+            self.latency = latency
+            self.error_rate = error_rate
+        else:
+            self.latency += self.alpha * (latency - self.latency)
+            self.error_rate += self.alpha * (error_rate - self.error_rate)
+
+    # 分配权重：越快、错误越少的账号分到越多链接
+    @property
+    def weight(self):
+        latency = max(self.latency or DEFAULT_LATENCY, 0.001)
+        return 1.0 / (latency * (1.0 + ERROR_PENALTY * self.error_rate))
+
+_stats = {}
+
+# 获取账号的观测统计，跨批次保留
+def get_account_stats(account):
+    stats = _stats.get(account)
+    if stats is None:
+        stats = _stats[account] = AccountStats()
+    return stats
+
+# 平滑加权轮询：按权重交错地选出账号，权重相同时即为普通轮询
+class WeightedRoundRobin:
+    def __init__(self, weights):
+        self.weights = weights
+        self.total = sum(weights.values())
+        self.current = {account: 0.0 for account in weights}
+
+    def pick(self):
+        for account, weight in self.weights.items():
+            self.current[account] += weight
+        best = max(self.current, key=self.current.get)
+        self.current[best] -= self.total
+        return best
+
+# 创建账号选择器，strategy 为 weighted（按观测延迟和错误率加权）或 round_robin
+def make_picker(accounts, strategy="weighted"):
+    if strategy == "round_robin":
+        weights = {account: 1.0 for account in accounts}
+    else:
+        weights = {account: get_account_stats(account).weight for account in accounts}
+    return WeightedRoundRobin(weights)
+
+# 账号池中的目标：[(账号, cookie, 目录ID)]，目录取 pool_folders 中指定的目录，否则取第一个目录
+# Cookie 已失效的账号不参与分配
+def pool_targets(config):
+    pool_folders = config.get('pool_folders', {})
+    monitor = get_cookie_monitor()
+    targets = []
+    for account, data in config.get('cookies', {}).items():
+        cid_map = data.get('cid') or {}
+        if not cid_map or monitor.is_expired(account, data.get('cookie')):
+            continue
+        folder_name = pool_folders.get(account)
+        folder_id = cid_map[folder_name] if folder_name in cid_map else next(iter(cid_map.values()))
+        targets.append((account, data['cookie'], folder_id))
+    return targets
@@ -0,0 +1,238 @@
+import asyncio
+import random
+import time
+
+from metrics import GUARD_EVENTS, gauge_callback, observe_api
+
+# 115 限流类错误的关键字，只包含明确表示请求过快的提示
+# “请稍后再试”等泛化提示也会出现在服务器繁忙等错误中，不能据此判断为限流
+RATE_LIMIT_KEYWORDS = ("频繁", "请求过多", "请求次数过多", "too many", "rate limit")
+
+# 115 临时性错误的关键字，可以重试
+TRANSIENT_KEYWORDS = RATE_LIMIT_KEYWORDS + ("稍后再试", "繁忙", "超时", "timeout", "网络", "服务器错误")
+
+# 115 登录失效的错误码
+LOGIN_ERRNO = 99
+
+# 网络层异常的类名（httpx 等 HTTP 库的异常不继承 OSError）
+NETWORK_ERROR_NAMES = {
+    "TimeoutException", "TransportError", "NetworkError", "ConnectError", "ReadError",
+    "WriteError", "RemoteProtocolError", "PoolTimeout", "ReadTimeout", "ConnectTimeout",
+    "BusyOSError",
+}
+
+# 不可重试的异常类名（cookie 失效、资源不存在等）
+PERMANENT_ERROR_NAMES = {
+    "AuthenticationError", "LoginError", "FileNotFoundError", "PermissionError",
+    "NotADirectoryError", "IsADirectoryError", "ValueError", "TypeError",
+}
+
+# 重试和熔断统计
+GUARD_STATS = {"calls": 0, "retries": 0, "failures": 0, "throttled": 0, "trips": 0, "circuit_waits": 0, "rejected": 0}
+
+# 熔断试探请求进行中时，等待试探结果的轮询间隔（秒）
+PROBE_POLL_INTERVAL = 0.5
+
+def _count(event):
+    GUARD_STATS[event] += 1
+    GUARD_EVENTS.inc(event)
+
+# 判断 115 的返回是否为限流类错误
+def is_rate_limited(res):
+    message = str(res.get('error') or res.get('error_msg') or '').lower()
+    return any(keyword in message for keyword in RATE_LIMIT_KEYWORDS)
+
+# 判断 115 的返回是否为登录失效（cookie 过期），提示中可能带有“超时”等字样
+def is_login_error(res):
+    message = str(res.get('error') or res.get('error_msg') or '')
+    return res.get('errno') == LOGIN_ERRNO or '登录' in message
+
+# 判断 115 的返回是否为可重试的临时错误
+def is_transient_response(res):
+    if res.get('state', False) or is_login_error(res):
+        return False
+    message = str(res.get('error') or res.get('error_msg') or '').lower()
+    return any(keyword in message for keyword in TRANSIENT_KEYWORDS)
+
+# 判断异常是否可重试
+def is_transient_error(exc):
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & PERMANENT_ERROR_NAMES:
+        return False
+    if names & NETWORK_ERROR_NAMES:
+        return True
+    return isinstance(exc, (OSError, asyncio.TimeoutError))
+
+# 账号熔断时抛出的异常
+class CircuitOpenError(Exception):
+    pass
+
+# 带抖动的指数退避重试策略
+# attempts 为临时错误的尝试次数，rate_limit_attempts 为遇到限流时的尝试次数
+# circuit_wait 为熔断打开时最多等待冷却的时间（秒），超过后才放弃
+class RetryPolicy:
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8.0, rate_limit_attempts=6, circuit_wait=90.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_attempts = rate_limit_attempts
+        self.circuit_wait = circuit_wait
+
+    # 第 attempt 次失败后的等待时间（full jitter）
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+# 账号级熔断器：连续临时失败达到阈值后暂停请求，冷却后放行一次试探请求
+# 限流不计入失败：限流说明服务端正常，只是请求过快，由节奏控制放慢即可
+class CircuitBreaker:
+    def __init__(self, threshold=5, cooldown=60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    # 是否允许发出请求
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    # 距离冷却结束的秒数，熔断关闭或已到试探阶段时为 0
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    # 请求没有得出结论（如被限流），不改变失败计数，只释放试探名额
+    def release(self):
+        self.probing = False
+
+    def on_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None or self.probing:
+                _count("trips")
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+DEFAULT_POLICY = RetryPolicy()
+
+_breakers = {}
+
+# 获取账号的熔断器
+def get_breaker(account=None):
+    breaker = _breakers.get(account)
+    if breaker is None:
+        breaker = _breakers[account] = CircuitBreaker()
+    return breaker
+
+# 熔断打开时等待冷却结束和试探结果，最多等待 policy.circuit_wait 秒，仍不允许请求时抛出 CircuitOpenError
+# 返回本次请求是否为半开状态下的试探请求
+async def _wait_for_circuit(breaker, account, policy):
+    deadline = time.monotonic() + policy.circuit_wait
+    waited = False
+    while True:
+        probe = breaker.state == "half_open"
+        if breaker.allow():
+            return probe
+        delay = breaker.retry_after() or PROBE_POLL_INTERVAL
+        if time.monotonic() + delay > deadline:
+            _count("rejected")
+            raise CircuitOpenError(f"账号 {account or ''} 连续请求失败，已暂停请求，请稍后再试")
+        if not waited:
+            _count("circuit_waits")
+            waited = True
+        await asyncio.sleep(delay)
+
+# 带重试和熔断的 115 API 调用，make_call() 返回一个可等待对象，call 为用于指标统计的调用类型
+# pacer 为账号的节奏控制器，每次请求前 wait()（返回请求开始时间），成功时 on_success()，限流时 on_rate_limit(开始时间)
+async def guarded_call(account, make_call, policy=DEFAULT_POLICY, call='other', pacer=None):
+    breaker = get_breaker(account)
+    _count("calls")
+
+    failures = throttles = 0
+    while True:
+        started = None
+        if pacer is not None:
+            started = await pacer.wait()
+        probe = await _wait_for_circuit(breaker, account, policy)
+
+        start = time.perf_counter()
+        try:
+            res = await make_call()
+        except Exception as e:
+            observe_api(call, time.perf_counter() - start, None)
+            if not is_transient_error(e):
+                breaker.on_success()
+                raise
+            breaker.on_failure()
+            _count("failures")
+            failures += 1
+            if failures >= policy.attempts:
+                raise
+            delay = policy.delay(failures - 1)
+        except BaseException:
+            # 请求被取消时释放试探名额，否则熔断器会一直停在试探中、拒绝该账号的所有请求
+            if probe:
+                breaker.release()
+            raise
+        else:
+            observe_api(call, time.perf_counter() - start, res)
+            if isinstance(res, dict) and not res.get('state', False) and is_rate_limited(res):
+                # 限流不计入熔断，交给节奏控制放慢后重试
+                if probe:
+                    breaker.release()
+                _count("throttled")
+                throttles += 1
+                if pacer is not None:
+                    pacer.on_rate_limit(started)
+                if throttles >= policy.rate_limit_attempts:
+                    return res
+                # 有节奏控制时由其决定等待时间，否则按退避策略等待
+                delay = 0.0 if pacer is not None else policy.delay(throttles - 1)
+            elif not isinstance(res, dict) or not is_transient_response(res):
+                breaker.on_success()
+                if pacer is not None and (not isinstance(res, dict) or res.get('state', False)):
+                    pacer.on_success()
+                return res
+            else:
+                breaker.on_failure()
+                _count("failures")
+                failures += 1
+                if failures >= policy.attempts:
+                    return res
+                delay = policy.delay(failures - 1)
+
+        _count("retries")
+        await asyncio.sleep(delay)
+
+# 当前未关闭的熔断器数
+def open_circuit_count():
+    return sum(1 for breaker in _breakers.values() if breaker.state != "closed")
+
+gauge_callback('zcbot_open_circuits', 'Accounts whose circuit breaker is open or half-open', open_circuit_count)
+
+# 重试和熔断统计信息
+def guard_stats():
+    return {
+        **GUARD_STATS,
+        "open_circuits": [account for account, breaker in _breakers.items() if breaker.state != "closed"],
+    }
@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import config_utils
+from config_utils import save_config, flush_config, get_config, has_permission, is_user_bound
+from link_parser import extract_all_links, extract_share_info, find_valid_links
+
+# 与基线相比允许的性能退化比例
+REGRESSION_TOLERANCE = 0.2
+
+# 生成带有多个账号和目录的测试配置
+def make_config(accounts=20, folders=10):
+    cookies = {}
+    for i in range(accounts):
+        cookies[f"账号{i}"] = {
+            "cookie": f"UID={i}_0_0; CID={i:032x}; SEID={i:064x}; KID={i:032x}",
+            "cid": {f"目录{j}": str(3000000000000000000 + i * 100 + j) for j in range(folders)}
+        }
+    return {"tg_token": "0:bench", "bound_user_id": "10000", "cookies": cookies}
+
+# 模拟一次更新在改造前的配置访问：has_permission、is_user_bound、handler 各读取一次文件
+def _update_uncached(user_id):
+    config_utils._read_config_file().get("bound_user_id")
+    config_utils._read_config_file().get("bound_user_id") == str(user_id)
+    config_utils._read_config_file()["cookies"]
+
+# 模拟一次更新在改造后的配置访问
+def _update_cached(user_id):
+    has_permission(user_id)
+    is_user_bound(user_id)
+    get_config()["cookies"]
+
+def _timeit(func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func("10000")
+    return (time.perf_counter() - start) / n
+
+# 配置读取基准：每条更新的配置访问开销
+def bench_config(n=2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        old_file = config_utils.CONFIG_FILE
+        config_utils.CONFIG_FILE = os.path.join(tmp, "config.json")
+        try:
+            save_config(make_config())
+            flush_config()
+            before = _timeit(_update_uncached, n)
+            after = _timeit(_update_cached, n)
+        finally:
+            config_utils.CONFIG_FILE = old_file
+
+    print("[config] 每条更新的配置访问开销")
+    print(f"  改造前(每次读文件): {before * 1e6:9.1f} µs/update")
+    print(f"  改造后(mtime缓存):  {after * 1e6:9.1f} µs/update")
+    print(f"  加速比: {before / after:.1f}x")
+    return {"config.cached_us": after * 1e6}
+
+# 模拟 Telegram text_link 实体
+class _Entity:
+    def __init__(self, url):
+        self.type = 'text_link'
+        self.url = url
+
+_FILLER = ["分享一部纪录片", "链接如下", "提取码见链接", "资源来自网络，仅供学习", "合集更新到第12集", "高清无水印"]
+_SHARE_HOSTS = ["https://115.com/s/", "https://115cdn.com/s/", "https://anxia.com/s/", "115.com/s/", "anxia.com/s/"]
+_PUNCT = ["", "", ",", ".", "；", "'", "\"", ")"]
+
+# 随机生成一个链接
+def _random_link(rng):
+    kind = rng.random()
+    token = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(11))
+    if kind < 0.45:
+        return f"{rng.choice(_SHARE_HOSTS)}{token}?password={token[:4]}"
+    if kind < 0.7:
+        return f"magnet:?xt=urn:btih:{rng.getrandbits(160):040x}&dn={token}"
+    if kind < 0.8:
+        return f"ed2k://|file|{token}.mkv|{rng.randint(10**6, 10**10)}|{rng.getrandbits(128):032X}|/"
+    return f"https://example{rng.randint(1, 50)}.com/{token}/file.zip"
+
+# 生成包含 n 个链接的消息语料：中文混排、尾随标点、重复链接、仅实体链接和病态行
+def make_corpus(n, seed=115):
+    rng = random.Random(seed)
+    lines = []
+    entities = []
+    for i in range(n):
+        link = _random_link(rng)
+        roll = rng.random()
+        if roll < 0.05:
+            # 仅存在于实体中的链接
+            entities.append(_Entity(link if "://" in link or link.startswith("magnet") else "https://" + link))
+            lines.append(rng.choice(_FILLER))
+            continue
+        if roll < 0.1 and lines:
+            # 重复粘贴的链接
+            lines.append(lines[rng.randrange(len(lines))])
+            continue
+        lines.append(f"{rng.choice(_FILLER)}：{link}{rng.choice(_PUNCT)} {rng.choice(_FILLER)}")
+        if i % 500 == 499:
+            # 病态行：很长的无空白文本、只有域名没有分享路径、不完整的磁力前缀
+            lines.append("115.com" * 2000)
+            lines.append("magnet:" * 500 + "ed2k:" * 500)
+            lines.append("x" * 20000 + "https://")
+    return "\n".join(lines), entities
+
+# 测量函数的耗时和峰值内存（内存单独测量一次，避免 tracemalloc 影响计时）
+def _measure(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = func()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, out
+
+# 链接提取基准：各提取函数在不同规模语料上的吞吐量和峰值内存
+def bench_links(sizes=(10, 1000, 10000)):
+    metrics = {}
+    print("[links] 链接提取吞吐量和峰值内存")
+    for n in sizes:
+        content, entities = make_corpus(n)
+        size_mb = len(content.encode("utf-8")) / 1e6
+        repeat = max(1, 2000 // n)
+        share_links = extract_all_links(content, entities)["share_links"]
+        extractors = {
+            "extract_all_links": lambda: extract_all_links(content, entities),
+            "find_valid_links": lambda: find_valid_links(content),
+            "extract_share_info": lambda: [extract_share_info(link) for link in share_links],
+        }
+        for name, func in extractors.items():
+            elapsed, peak, out = _measure(func, repeat)
+            count = sum(len(v) for v in out.values()) if isinstance(out, dict) else len(out)
+            metrics[f"links.{name}.{n}.links_per_sec"] = count / elapsed
+            print(f"  {name:<19} n={n:<6} {count:>6} 个链接  {elapsed * 1e3:9.2f} ms"
+                  f"  {count / elapsed:12.0f} 个/秒  {size_mb / elapsed:7.1f} MB/s  峰值内存 {peak / 1024:8.1f} KiB")
+    return metrics
+
+BENCHMARKS = {
+    "config": bench_config,
+    "links": bench_links,
+}
+
+# 与基线比较，*_per_sec 越大越好，*_us 越小越好
+def compare_baseline(metrics, baseline):
+    regressions = []
+    for key, value in metrics.items():
+        old = baseline.get(key)
+        if not old:
+            continue
+        if key.endswith("_per_sec"):
+            ratio = value / old
+        else:
+            ratio = old / value
+        if ratio < 1 - REGRESSION_TOLERANCE:
+            regressions.append(f"  {key}: {old:.1f} -> {value:.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="115zcbot 性能基准测试")
+    parser.add_argument("names", nargs="*", help=f"要运行的基准（{', '.join(BENCHMARKS)}），默认全部")
+    parser.add_argument("--save", help="将结果保存为基线 JSON 文件")
+    parser.add_argument("--baseline", help="与指定的基线 JSON 文件比较，退化超过阈值时返回非零")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+
+    metrics = {}
+    for name in args.names or list(BENCHMARKS):
+        metrics.update(BENCHMARKS[name]() or {})
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_baseline(metrics, json.load(f))
+        if regressions:
+            print("性能退化:")
+            print("\n".join(regressions))
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,78 @@
+import secrets
+import time
+from collections import OrderedDict
+
+# 按钮回调的默认有效期（秒）
+DEFAULT_TTL = 24 * 3600
+
+# 最多保留的回调数，超出时淘汰最久未使用的
+MAX_ENTRIES = 10000
+
+# 令牌长度（字节），编码后为 8 个字符
+TOKEN_BYTES = 6
+
+# 按钮回调注册表：callback_data 中只放 "前缀 + 短令牌"，令牌对应的操作保存在服务端
+# Telegram 限制 callback_data 不超过 64 字节，较长的中文账号名和目录名无法直接放入
+class CallbackRegistry:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # {令牌: (前缀, 操作, 过期时间, 去重键)}，按最近使用排序
+        self._entries = OrderedDict()
+        # {去重键: 令牌}，相同的操作复用同一个令牌，反复打开菜单不会无限增长
+        self._tokens = {}
+
+    # 注册一个操作，返回可直接用作 callback_data 的字符串；操作的值必须可哈希
+    def make(self, prefix, **action):
+        key = (prefix, tuple(sorted(action.items())))
+        expires = time.monotonic() + self.ttl
+        token = self._tokens.get(key)
+        if token is not None and token in self._entries:
+            self._entries[token] = (prefix, action, expires, key)
+            self._entries.move_to_end(token)
+            return prefix + token
+
+        token = secrets.token_urlsafe(TOKEN_BYTES)
+        while token in self._entries:
+            token = secrets.token_urlsafe(TOKEN_BYTES)
+        self._entries[token] = (prefix, action, expires, key)
+        self._tokens[key] = token
+        while len(self._entries) > self.max_entries:
+            self._discard(*self._entries.popitem(last=False))
+        return prefix + token
+
+    # 解析 callback_data，返回操作的副本；令牌不存在、已过期或前缀不符时返回 None
+    def resolve(self, data, prefix):
+        if not data or not data.startswith(prefix):
+            return None
+        token = data[len(prefix):]
+        entry = self._entries.get(token)
+        if entry is None or entry[0] != prefix:
+            return None
+        if entry[2] < time.monotonic():
+            del self._entries[token]
+            self._discard(token, entry)
+            return None
+        self._entries.move_to_end(token)
+        return dict(entry[1])
+
+    def _discard(self, token, entry):
+        if self._tokens.get(entry[3]) == token:
+            del self._tokens[entry[3]]
+
+    def __len__(self):
+        return len(self._entries)
+
+_registry = CallbackRegistry()
+
+# 获取进程内共享的回调注册表
+def get_callback_registry():
+    return _registry
+
+# 生成按钮的 callback_data，如 make_callback("mixed_", account="账号", target="select")
+def make_callback(prefix, **action):
+    return _registry.make(prefix, **action)
+
+# 解析按钮的 callback_data，返回操作字典或 None
+def resolve_callback(data, prefix):
+    return _registry.resolve(data, prefix)
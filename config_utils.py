@@ -1,9 +1,22 @@
+import atexit
+import copy
 import json
+import logging
 import os
+import tempfile
+import threading
+
+from metrics import CONFIG_LATENCY
+from tracing import span
+
+logger = logging.getLogger(__name__)
 
 # 配置文件路径
 CONFIG_FILE = 'config.json'
 
+# 写入合并延迟（秒），短时间内的多次修改只落盘一次
+SAVE_DELAY = 0.5
+
 # 默认配置
 DEFAULT_CONFIG = {
     "tg_token": "",
@@ -11,33 +24,162 @@ DEFAULT_CONFIG = {
     "cookies": {}
 }
 
-# 从配置文件读取配置
-def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        save_config(DEFAULT_CONFIG)
-        return DEFAULT_CONFIG
-        
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        try:
+# 进程内配置缓存，按文件 mtime/size 失效；dirty 表示有尚未落盘的修改
+_config_cache = {"data": None, "stat": None, "dirty": False}
+_cache_lock = threading.Lock()
+
+# 待写入的配置快照和写入定时器
+_pending = {"data": None, "timer": None}
+_write_lock = threading.Lock()
+
+# 备份文件路径，保存最近一次有效的配置
+def _backup_file():
+    return CONFIG_FILE + '.bak'
+
+# 获取配置文件的 (mtime, size)，文件不存在时返回 None
+def _file_stat():
+    try:
+        st = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+# 读取并解析 JSON 文件，文件不存在或格式错误时返回 None
+def _try_read(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
-        except json.JSONDecodeError:
-            print("配置文件格式错误，重置为默认配置")
-            save_config(DEFAULT_CONFIG)
-            return DEFAULT_CONFIG
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+# 直接从磁盘读取配置，主文件缺失或损坏时从备份恢复
+def _read_config_file():
+    with CONFIG_LATENCY.time('load'), span('config_load'):
+        data = _try_read(CONFIG_FILE)
+    if data is not None:
+        return data
+
+    backup = _try_read(_backup_file())
+    if backup is not None:
+        logger.warning("配置文件缺失或格式错误，已从备份恢复")
+        save_config(backup)
+        return backup
+
+    if os.path.exists(CONFIG_FILE):
+        logger.warning("配置文件格式错误，重置为默认配置")
+        # 保留损坏的文件以便手动恢复
+        os.replace(CONFIG_FILE, CONFIG_FILE + '.corrupt')
+    save_config(DEFAULT_CONFIG)
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+# 原子写入 JSON 文件：临时文件 + fsync + rename
+def _atomic_write(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # 确保 rename 本身落盘（部分平台不支持对目录 fsync）
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+# 写入配置文件，并同步一份到备份文件，保证备份始终是最近一次有效的配置
+def _write_config_file(config_data):
+    _atomic_write(CONFIG_FILE, config_data)
+    _atomic_write(_backup_file(), config_data)
 
-# 保存配置文件
+# 将待写入的配置落盘，可在退出前直接调用
+def flush_config():
+    with _write_lock:
+        with _cache_lock:
+            data = _pending["data"]
+            timer = _pending["timer"]
+            _pending["data"] = None
+            _pending["timer"] = None
+        if timer is not None:
+            timer.cancel()
+        if data is None:
+            return
+
+        try:
+            with CONFIG_LATENCY.time('save'):
+                _write_config_file(data)
+        except OSError as e:
+            logger.error("保存配置文件失败: %s", e)
+            # 放回待写队列，等待下一次保存时重试
+            with _cache_lock:
+                if _pending["data"] is None:
+                    _pending["data"] = data
+            return
+
+        with _cache_lock:
+            if _pending["data"] is None:
+                _config_cache["dirty"] = False
+                _config_cache["stat"] = _file_stat()
+
+atexit.register(flush_config)
+
+# 获取缓存中的配置（只读，调用方不得修改返回值）
+def _cached_config():
+    stat = _file_stat()
+    with _cache_lock:
+        if _config_cache["data"] is not None and (_config_cache["dirty"] or _config_cache["stat"] == stat):
+            return _config_cache["data"]
+
+    # 先记录 stat 再读取，读取期间文件若被改动，下次访问会重新加载
+    data = _read_config_file()
+    with _cache_lock:
+        if stat is None:
+            stat = _file_stat()
+        _config_cache["data"] = data
+        _config_cache["stat"] = stat
+    return data
+
+# 获取只读配置，供只读路径使用，避免复制开销
+def get_config():
+    return _cached_config()
+
+# 从配置文件读取配置（返回可修改的副本）
+def load_config():
+    return copy.deepcopy(_cached_config())
+
+# 保存配置文件：立即更新缓存，在后台线程中合并写入磁盘
 def save_config(config_data):
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as file:
-        json.dump(config_data, file, indent=4, ensure_ascii=False)
+    snapshot = copy.deepcopy(config_data)
+    with _cache_lock:
+        _config_cache["data"] = snapshot
+        _config_cache["dirty"] = True
+        _pending["data"] = snapshot
+        if _pending["timer"] is None:
+            timer = threading.Timer(SAVE_DELAY, flush_config)
+            timer.daemon = True
+            _pending["timer"] = timer
+            timer.start()
 
 # 检查用户是否绑定
 def is_user_bound(user_id):
-    config = load_config()
+    config = _cached_config()
     return config.get("bound_user_id") == str(user_id)
 
 # 判断是否已绑定且当前用户是否有权限操作
 def has_permission(user_id):
-    config = load_config()
+    config = _cached_config()
     bound_id = config.get("bound_user_id")
     # 如果未绑定，任何人都有权限
     if bound_id is None:
@@ -48,15 +190,15 @@ def has_permission(user_id):
 # 添加/更新账号配置
 def update_account(account_name, cookie, folder_name=None, cid=None):
     config = load_config()
-    
+
     if account_name not in config['cookies']:
         config['cookies'][account_name] = {'cookie': cookie, 'cid': {}}
     else:
         config['cookies'][account_name]['cookie'] = cookie
-        
+
     if folder_name and cid:
         config['cookies'][account_name]['cid'][folder_name] = cid
-        
+
     save_config(config)
     return True
 
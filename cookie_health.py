@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+from config_utils import get_config
+from metrics import gauge_callback
+from p115_transfer import verify_cookie
+
+logger = logging.getLogger(__name__)
+
+# 默认检查间隔（秒）
+CHECK_INTERVAL = 3600
+
+# 账号的检查结果：ok 为 cookie 是否有效，detail 为用户名或错误信息
+AccountHealth = namedtuple('AccountHealth', ['cookie', 'ok', 'detail', 'checked_at'])
+
+# 获取检查间隔，不大于 0 时关闭后台检查
+def get_check_interval():
+    try:
+        return float(get_config().get('cookie_check_interval', CHECK_INTERVAL))
+    except (TypeError, ValueError):
+        return CHECK_INTERVAL
+
+# Cookie 健康检查：后台定期并发验证所有账号，缓存结果和用户名
+# 已失效的账号在选择键盘中标出、不参与账号池，失效时提醒绑定的用户
+class CookieMonitor:
+    def __init__(self):
+        # {账号: AccountHealth}
+        self._health = {}
+        # 已发送过失效提醒的账号，恢复有效前不再重复提醒
+        self._alerted = set()
+        self._task = None
+        self._wakeup = None
+
+    # 获取账号的缓存结果，cookie 已更改时视为未检查
+    def get(self, account, cookie):
+        health = self._health.get(account)
+        if health is None or health.cookie != cookie:
+            return None
+        return health
+
+    # 判断账号的 cookie 是否已确认失效；未检查或无法判断时不视为失效
+    def is_expired(self, account, cookie):
+        health = self.get(account, cookie)
+        return health is not None and not health.ok
+
+    # 账号在选择键盘中显示的名称
+    def label(self, account, cookie):
+        if self.is_expired(account, cookie):
+            return f"{account}（Cookie 已失效）"
+        return account
+
+    # 账号详情中显示的状态
+    def status_text(self, account, cookie):
+        health = self.get(account, cookie)
+        if health is None:
+            return "未检查"
+        checked = time.strftime('%Y-%m-%d %H:%M', time.localtime(health.checked_at))
+        if health.ok:
+            return f"有效（{health.detail}，{checked} 检查）"
+        return f"已失效（{health.detail}，{checked} 检查）"
+
+    def expired_count(self):
+        cookies = get_config().get('cookies', {})
+        return sum(1 for account, data in cookies.items() if self.is_expired(account, data.get('cookie')))
+
+    # 检查一个账号，返回新的结果；临时失败时保留上一次的结果
+    async def check_account(self, account, cookie):
+        ok, detail = await verify_cookie(cookie, account)
+        if ok is None:
+            logger.warning("无法验证账号 %s 的 Cookie: %s", account, detail)
+            return self.get(account, cookie)
+        health = AccountHealth(cookie, ok, detail, time.time())
+        self._health[account] = health
+        if not ok:
+            logger.warning("账号 %s 的 Cookie 已失效: %s", account, detail)
+        return health
+
+    # 并发检查所有账号，新失效或恢复的账号通过 bot 通知绑定的用户
+    async def check_all(self, bot=None):
+        cookies = get_config().get('cookies', {})
+        for account in list(self._health):
+            if account not in cookies:
+                del self._health[account]
+                self._alerted.discard(account)
+
+        accounts = [(account, data['cookie']) for account, data in cookies.items() if data.get('cookie')]
+        results = await asyncio.gather(*(self.check_account(account, cookie) for account, cookie in accounts))
+
+        expired, recovered = [], []
+        for (account, _), health in zip(accounts, results):
+            if health is None:
+                continue
+            if not health.ok and account not in self._alerted:
+                self._alerted.add(account)
+                expired.append(f"- {account}: {health.detail}")
+            elif health.ok and account in self._alerted:
+                self._alerted.discard(account)
+                recovered.append(f"- {account}")
+        logger.info("Cookie 检查完成: %d 个账号, %d 个已失效", len(accounts), self.expired_count())
+
+        if bot is not None and (expired or recovered):
+            await self._notify(bot, expired, recovered)
+
+    async def _notify(self, bot, expired, recovered):
+        bound_user_id = get_config().get('bound_user_id')
+        if not bound_user_id:
+            return
+        lines = []
+        if expired:
+            lines.append("以下账号的 Cookie 已失效，请使用 /115set 更新：")
+            lines.extend(expired)
+        if recovered:
+            lines.append("以下账号的 Cookie 已恢复有效：")
+            lines.extend(recovered)
+        try:
+            await bot.send_message(int(bound_user_id), "\n".join(lines))
+        except Exception as e:
+            logger.warning("发送 Cookie 失效提醒失败: %s", e)
+
+    # 尽快进行一次检查，如账号或 cookie 更改后
+    def check_soon(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, bot):
+        if get_check_interval() <= 0:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(bot))
+        gauge_callback('zcbot_expired_accounts', 'Accounts whose cookie failed verification', self.expired_count)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, bot):
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.check_all(bot)
+            except Exception:
+                logger.exception("检查 Cookie 失败")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(1.0, get_check_interval()))
+            except asyncio.TimeoutError:
+                pass
+
+_monitor = CookieMonitor()
+
+# 获取进程内共享的 Cookie 健康检查
+def get_cookie_monitor():
+    return _monitor
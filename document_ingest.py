@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import tempfile
+from collections import namedtuple
+
+from config_utils import get_config
+from link_parser import iter_text_links
+from torrent_parser import iter_torrent_magnets
+
+logger = logging.getLogger(__name__)
+
+# Bot API 允许下载的最大文件大小
+MAX_DOCUMENT_SIZE = 20 * 1024 * 1024
+
+# 文档拆分为任务时每个任务的链接数
+DOCUMENT_CHUNK_LINKS = 1000
+
+# 等待选择账号和目录的文档（链接列表或种子），只保存 file_id，提交时才下载，避免临时文件残留
+DocumentSource = namedtuple('DocumentSource', ['file_id', 'file_name', 'file_size'])
+
+# 种子文件和种子压缩包的扩展名
+TORRENT_SUFFIXES = ('.torrent', '.zip')
+
+# 判断附件是否为链接列表文本文件、种子文件或种子压缩包
+def is_link_document(document):
+    name = (document.file_name or "").lower()
+    mime_type = document.mime_type or ""
+    return (name.endswith(('.txt',) + TORRENT_SUFFIXES)
+            or mime_type.startswith('text/') or mime_type == 'application/x-bittorrent')
+
+def document_source(document):
+    name = document.file_name or ""
+    if not name.lower().endswith(('.txt',) + TORRENT_SUFFIXES):
+        name += '.torrent' if document.mime_type == 'application/x-bittorrent' else '.txt'
+    return DocumentSource(document.file_id, name, document.file_size or 0)
+
+# 获取每个任务的链接数
+def get_chunk_links():
+    try:
+        return max(1, int(get_config().get('document_chunk_links', DOCUMENT_CHUNK_LINKS)))
+    except (TypeError, ValueError):
+        return DOCUMENT_CHUNK_LINKS
+
+# 逐行读取文本文件中的链接
+def iter_text_file_links(path):
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        for line in f:
+            for _, url in iter_text_links(line):
+                yield url
+
+# 逐个产出文档中的链接：种子文件和种子压缩包转换为磁力链接，其他按文本逐行解析
+def iter_document_links(path, file_name):
+    if file_name.lower().endswith(TORRENT_SUFFIXES):
+        return iter_torrent_magnets(path, file_name)
+    return iter_text_file_links(path)
+
+# 读取文档中的链接，每凑满 chunk_links 个链接产出一段以换行分隔的链接文本
+# 只在内存中保留当前这一段，块内去重
+def iter_link_chunks(path, file_name, chunk_links=DOCUMENT_CHUNK_LINKS):
+    chunk = []
+    seen = set()
+    for url in iter_document_links(path, file_name):
+        if url in seen:
+            continue
+        seen.add(url)
+        chunk.append(url)
+        if len(chunk) >= chunk_links:
+            yield "\n".join(chunk)
+            chunk = []
+            seen.clear()
+    if chunk:
+        yield "\n".join(chunk)
+
+# 下载文档到临时文件，返回文件路径，调用方负责删除
+async def download_document(bot, source):
+    fd, path = tempfile.mkstemp(prefix='.links.', suffix=os.path.splitext(source.file_name)[1])
+    os.close(fd)
+    try:
+        file = await bot.get_file(source.file_id)
+        await file.download_to_drive(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+# 下载文档并分块提交，submit_chunk(index, content) 负责提交第 index 块（从 1 开始），返回提交的块数
+async def ingest_document(bot, source, submit_chunk):
+    path = await download_document(bot, source)
+    count = 0
+    try:
+        for content in iter_link_chunks(path, source.file_name, get_chunk_links()):
+            count += 1
+            await submit_chunk(count, content)
+            # 每块之间让出事件循环，大文件不会长时间阻塞其他更新
+            await asyncio.sleep(0)
+    finally:
+        os.remove(path)
+    logger.info("文档 %s 已拆分为 %d 个任务提交", source.file_name, count)
+    return count
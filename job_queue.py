@@ -0,0 +1,187 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from log_utils import reset_correlation_id, set_correlation_id
+from metrics import gauge_callback
+from tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+# 任务数据库路径
+JOBS_FILE = 'jobs.db'
+
+# 默认的工作协程数量
+DEFAULT_WORKERS = 2
+
+# 已完成任务的保留时间（秒）
+JOB_RETENTION = 7 * 24 * 3600
+
+# 持久化的 text_link 实体，只保留链接解析需要的字段
+LinkEntity = namedtuple('LinkEntity', ['type', 'url'])
+
+# 序列化消息实体，仅保留 text_link
+def dump_entities(entities):
+    return json.dumps([
+        {"type": entity.type, "url": entity.url}
+        for entity in entities or ()
+        if entity.type == 'text_link' and entity.url
+    ])
+
+def load_entities(data):
+    return [LinkEntity(item["type"], item["url"]) for item in json.loads(data or "[]")]
+
+# 持久化的链接处理任务队列：任务先写入 SQLite，再由工作协程消费，重启后自动恢复未完成的任务
+class LinkJobQueue:
+    def __init__(self, path=JOBS_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " chat_id INTEGER NOT NULL,"
+            " message_id INTEGER NOT NULL,"
+            " account TEXT NOT NULL,"
+            " folder_id TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " entities TEXT NOT NULL,"
+            " force INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL,"
+            " result TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.commit()
+        self._queue = None
+        self._workers = []
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor
+
+    # 提交任务，返回任务 ID
+    def submit(self, chat_id, message_id, account, folder_id, content, entities=None, force=False):
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO jobs (chat_id, message_id, account, folder_id, content, entities, force, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, 'pending', ?, ?)",
+            (chat_id, message_id, account, str(folder_id), content, dump_entities(entities), int(force), now, now),
+        )
+        job_id = cursor.lastrowid
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    # 读取任务
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["entities"] = load_entities(job["entities"])
+        job["force"] = bool(job["force"])
+        return job
+
+    def set_status(self, job_id, status, result=None):
+        self._execute(
+            "UPDATE jobs SET status=?, result=?, updated_at=? WHERE id=?",
+            (status, result, time.time(), job_id),
+        )
+
+    # 未完成（等待中或运行中）的任务 ID
+    def unfinished(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('pending', 'running') ORDER BY id"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    # 当前排队等待的任务数
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # 启动工作协程，process(bot, job) 返回要回复给用户的结果文本
+    async def start(self, bot, process, workers=DEFAULT_WORKERS):
+        self._execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+            (time.time() - JOB_RETENTION,),
+        )
+        self._queue = asyncio.Queue()
+        for job_id in self.unfinished():
+            self._queue.put_nowait(job_id)
+        if self._queue.qsize():
+            logger.info("恢复 %d 个未完成的任务", self._queue.qsize())
+        self._workers = [
+            asyncio.create_task(self._worker(bot, process)) for _ in range(max(1, workers))
+        ]
+        gauge_callback('zcbot_job_queue_depth', 'Link jobs waiting in the queue', self.depth)
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self, bot, process):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(bot, process, job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, bot, process, job_id):
+        # 任务内的日志都带上任务 ID
+        token = set_correlation_id(f"job-{job_id}")
+        try:
+            await self._run_job(bot, process, job_id)
+        finally:
+            reset_correlation_id(token)
+
+    @traced('link_job')
+    async def _run_job(self, bot, process, job_id):
+        job = self.get(job_id)
+        if job is None or job["status"] not in ('pending', 'running'):
+            return
+
+        self.set_status(job_id, 'running')
+        try:
+            text = await process(bot, job)
+            status = 'done'
+        except Exception as e:
+            logger.exception("任务 %s 处理失败", job_id)
+            text = f"处理失败: {e}"
+            status = 'failed'
+        self.set_status(job_id, status, text)
+
+        try:
+            with span('reply'):
+                await bot.edit_message_text(text, chat_id=job["chat_id"], message_id=job["message_id"], parse_mode='Markdown')
+        except Exception as e:
+            logger.warning("任务 %s 更新回复失败: %s", job_id, e)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+# 获取进程内共享的任务队列
+def get_job_queue():
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = LinkJobQueue()
+        return _job_queue
@@ -0,0 +1,106 @@
+import base64
+import re
+import sqlite3
+import threading
+import time
+
+from link_parser import extract_share_info
+
+# 去重记录数据库路径
+LEDGER_FILE = 'ledger.db'
+
+_BTIH_RE = re.compile(r'xt=urn:btih:([0-9a-zA-Z]+)', re.IGNORECASE)
+_ED2K_RE = re.compile(r'^ed2k://\|file\|[^|]*\|\d+\|([0-9a-fA-F]{32})\|', re.IGNORECASE)
+
+# 从磁力链接中提取 btih，统一为小写十六进制
+def magnet_btih(url):
+    match = _BTIH_RE.search(url)
+    if not match:
+        return None
+    value = match.group(1)
+    if len(value) == 40:
+        return value.lower()
+    if len(value) == 32:
+        try:
+            return base64.b32decode(value.upper()).hex()
+        except ValueError:
+            return None
+    return None
+
+# 从电驴链接中提取文件哈希
+def ed2k_hash(url):
+    match = _ED2K_RE.match(url)
+    return match.group(1).lower() if match else None
+
+# 计算链接的去重键，不支持去重的链接返回 None
+def ledger_key(kind, url):
+    if kind == "share":
+        share_code, _ = extract_share_info(url)
+        return share_code
+    if kind == "magnet":
+        return magnet_btih(url)
+    if kind == "ed2k":
+        return ed2k_hash(url)
+    return None
+
+# 已转存记录：按 (类型, 键, 账号, 目录) 记录已成功提交的分享和离线任务
+class Ledger:
+    def __init__(self, path=LEDGER_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS saved ("
+            " kind TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " account TEXT NOT NULL,"
+            " cid TEXT NOT NULL,"
+            " saved_at REAL NOT NULL,"
+            " PRIMARY KEY (kind, key, account, cid))"
+        )
+        self._conn.commit()
+
+    # 判断是否已在该账号和目录下保存过
+    def contains(self, kind, key, account, cid):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM saved WHERE kind=? AND key=? AND account=? AND cid=?",
+                (kind, key, account or "", str(cid)),
+            ).fetchone()
+        return row is not None
+
+    # 批量记录保存成功的条目，entries 为 [(kind, key), ...]
+    def record(self, entries, account, cid):
+        rows = [(kind, key, account or "", str(cid), time.time()) for kind, key in entries if key]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO saved VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    # 将链接分为 (未保存过的, 已保存过的)
+    def partition(self, kind, urls, account, cid):
+        new, known = [], []
+        for url in urls:
+            key = ledger_key(kind, url)
+            if key and self.contains(kind, key, account, cid):
+                known.append(url)
+            else:
+                new.append(url)
+        return new, known
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+# 获取进程内共享的去重记录
+def get_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = Ledger()
+        return _ledger
@@ -0,0 +1,87 @@
+import re
+
+# 115分享链接使用的域名
+SHARE_DOMAINS = ("115.com/s/", "115cdn.com/s/", "anxia.com/s/")
+
+# 单次扫描识别所有链接类型，分支顺序即优先级
+_LINK_RE = re.compile(
+    r'(?P<magnet>magnet:\?xt=\S+)'
+    r'|(?P<ed2k>ed2k://\|\S+)'
+    r'|(?P<url>(?:https?|ftp)://\S+)'
+    r'|(?P<share>(?:115\.com|115cdn\.com|anxia\.com)/s/\S+)'
+)
+_SHARE_INFO_RE = re.compile(r's/(\w+)\?password=(\w+)')
+
+# 链接末尾需要清理的标点符号
+_TRAILING_PUNCTUATION = ',.;:"\']'
+
+# 链接类型与结果字典键的对应关系
+LINK_KEYS = {
+    "share": "share_links",    # 115分享链接
+    "url": "url_links",        # HTTP/HTTPS/FTP链接
+    "magnet": "magnet_links",  # 磁力链接
+    "ed2k": "ed2k_links",      # 电驴链接
+}
+
+# 改进的分享链接提取函数
+def extract_share_info(link: str):
+    # 处理链接并提取关键信息
+    link = link.replace("#", "").replace("&", "").replace(" ", "")
+
+    if any(domain in link for domain in SHARE_DOMAINS):
+        match = _SHARE_INFO_RE.search(link)
+        if match:
+            return match.group(1), match.group(2)
+
+    return None, None
+
+# 判断链接类型，无效的115分享链接返回 None
+def classify_link(url):
+    if any(domain in url for domain in SHARE_DOMAINS):
+        share_code, receive_code = extract_share_info(url)
+        return "share" if share_code and receive_code else None
+    if url.startswith("magnet:?xt="):
+        return "magnet"
+    if url.startswith("ed2k://"):
+        return "ed2k"
+    return "url"
+
+# 从文本中逐个产出 (类型, 链接)，不去重
+def iter_text_links(content):
+    for match in _LINK_RE.finditer(content):
+        kind = match.lastgroup
+        url = match.group().rstrip(_TRAILING_PUNCTUATION)
+        if kind == "share":
+            url = "https://" + url
+        if kind in ("url", "share"):
+            kind = classify_link(url)
+            if kind is None:
+                continue
+        yield kind, url
+
+# 逐个产出消息中的 (类型, 链接)：先处理 Telegram text_link 实体，再处理文本
+def iter_links(content, entities=None):
+    for entity in entities or ():
+        if entity.type == 'text_link' and entity.url:
+            kind = classify_link(entity.url)
+            if kind is not None:
+                yield kind, entity.url
+    yield from iter_text_links(content or "")
+
+# 提取所有类型的链接并分类，保持出现顺序去重
+def extract_all_links(content, entities=None):
+    result = {key: [] for key in LINK_KEYS.values()}
+    seen = set()
+    for kind, url in iter_links(content, entities):
+        if url not in seen:
+            seen.add(url)
+            result[LINK_KEYS[kind]].append(url)
+    return result
+
+# 判断消息中是否包含任何支持的链接
+def has_links(content, entities=None):
+    return next(iter_links(content, entities), None) is not None
+
+# 在整个文本中查找有效的115分享链接
+def find_valid_links(content: str):
+    return extract_all_links(content)["share_links"]
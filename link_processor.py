@@ -1,189 +1,241 @@
-import re
-import urllib.parse
-from p115 import P115Client, P115Offline
-from p115_transfer import extract_share_info, find_valid_links, share_save
-
-# 提取所有类型的链接并分类
-def extract_all_links(content, entities=None):
-    # 结果字典
-    result = {
-        "share_links": [],  # 115分享链接
-        "url_links": [],    # HTTP/HTTPS/FTP链接
-        "magnet_links": [], # 磁力链接
-        "ed2k_links": []    # 电驴链接
-    }
-    
-    # 1. 从实体中提取text_link类型的URL (Telegram特有)
-    if entities:
-        for entity in entities:
-            if entity.type == 'text_link' and entity.url:
-                url = entity.url
-                # 检查是否是115分享链接
-                if any(domain in url for domain in ["115.com/s/", "115cdn.com/s/", "anxia.com/s/"]):
-                    result["share_links"].append(url)
-                elif url.startswith("magnet:?xt="):
-                    result["magnet_links"].append(url)
-                elif url.startswith("ed2k://"):
-                    result["ed2k_links"].append(url)
-                else:
-                    result["url_links"].append(url)
-    
-    # 2. 从文本内容中提取常规链接
-    lines = content.split('\n')
-    
-    for line in lines:
-        # 首先检查行中是否包含关键词
-        if "115.com" in line or "115cdn.com" in line or "anxia.com" in line:
-            # 1. 首先尝试提取标准URL (带http/https)
-            urls = re.findall(r'https?://(?:115\.com|115cdn\.com|anxia\.com)/s/[^\s]+', line)
-            
-            # 2. 如果没找到标准URL，尝试提取无协议前缀的URL
-            if not urls:
-                # 匹配115.com或anxia.com开头的文本直到空格或行末
-                domain_matches = re.findall(r'((?:115\.com|115cdn\.com|anxia\.com)/s/[^\s]+)', line)
-                urls = ["https://" + match for match in domain_matches]
-            
-            for url in urls:
-                # 清理URL末尾可能的标点符号
-                url = url.rstrip(',.;:"\']')
-                share_code, receive_code = extract_share_info(url)
-                if share_code and receive_code and url not in result["share_links"]:
-                    result["share_links"].append(url)
-        
-        # 提取磁力链接
-        if "magnet:" in line:
-            magnet_urls = re.findall(r'magnet:\?xt=[^\s]+', line)
-            for url in magnet_urls:
-                url = url.rstrip(',.;:"\']')
-                if url not in result["magnet_links"]:
-                    result["magnet_links"].append(url)
-        
-        # 提取电驴链接
-        if "ed2k:" in line:
-            ed2k_matches = re.findall(r'ed2k://\|[^\s]+', line)
-            for url in ed2k_matches:
-                url = url.rstrip(',.;:"\']')
-                if url not in result["ed2k_links"]:
-                    result["ed2k_links"].append(url)
-        
-        # 提取其他HTTP链接 (排除已经找到的115链接)
-        http_urls = re.findall(r'https?://[^\s]+', line)
-        for url in http_urls:
-            url = url.rstrip(',.;:"\']')
-            if not any(domain in url for domain in ["115.com/s/", "115cdn.com/s/", "anxia.com/s/"]) and url not in result["url_links"]:
-                result["url_links"].append(url)
-    
-    return result
+import asyncio
+import logging
+import time
 
-# 混合处理所有类型链接
-async def process_mixed_links(cookie, content, folder_id, entities=None):
-    # 提取并分类所有链接
-    links = extract_all_links(content, entities)
-    
-    # 结果统计
-    results = {
-        "share": {"success": 0, "failure": 0, "reasons": []},
-        "offline": {"success": 0, "failure": 0, "reasons": []}
+from account_pool import get_account_stats, make_picker
+from api_guard import CircuitOpenError, guarded_call, is_login_error, is_rate_limited
+from config_utils import get_config
+from ledger import get_ledger, ledger_key
+from link_parser import extract_all_links, extract_share_info
+from metrics import observe_link_results
+from p115_transfer import get_client, get_pacer, transfer_shares
+from progress import ProgressTracker
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# 115 离线下载单次批量提交的链接数上限
+OFFLINE_BATCH_SIZE = 100
+
+# 获取单次批量离线提交的链接数
+def get_offline_batch_size():
+    try:
+        return max(1, int(get_config().get('offline_batch_size', OFFLINE_BATCH_SIZE)))
+    except (TypeError, ValueError):
+        return OFFLINE_BATCH_SIZE
+
+# 提交单个离线链接，返回 (url, 是否成功, 错误信息)
+async def submit_offline_url(client, url, folder_id, account=None):
+    payload = {"url": url}
+    if folder_id:
+        payload["wp_path_id"] = folder_id
+    try:
+        result = await guarded_call(
+            account, lambda: client.offline_add_url(payload, async_=True), call='offline_add_url', pacer=get_pacer(account)
+        )
+    except Exception as e:
+        return url, False, str(e)
+    if result.get("state", False):
+        return url, True, None
+    return url, False, result.get("error_msg", "未知错误")
+
+# 将批量提交的返回结果对应到每个链接，整体失败时返回 None
+def map_offline_results(chunk, result):
+    items = result.get("result")
+    if not isinstance(items, list) or not items:
+        if result.get("state", False):
+            return [(url, True, None) for url in chunk]
+        return None
+
+    by_url = {item.get("url"): item for item in items if isinstance(item, dict)}
+    mapped = []
+    for i, url in enumerate(chunk):
+        item = by_url.get(url)
+        if item is None and len(items) == len(chunk) and isinstance(items[i], dict):
+            item = items[i]
+        if item is None:
+            mapped.append((url, False, result.get("error_msg") or "未返回该链接的结果"))
+        elif item.get("state", False):
+            mapped.append((url, True, None))
+        else:
+            mapped.append((url, False, item.get("error_msg") or "未知错误"))
+    return mapped
+
+# 批量提交一块离线链接，返回结果无法对应到每个链接时退回逐个提交
+# 限流、登录失效和熔断时整块记为失败，不再逐个请求已被限流或已退出登录的账号
+async def submit_offline_chunk(client, chunk, folder_id, account=None):
+    if len(chunk) == 1:
+        return [await submit_offline_url(client, chunk[0], folder_id, account)]
+
+    payload = {f"url[{i}]": url for i, url in enumerate(chunk)}
+    if folder_id:
+        payload["wp_path_id"] = folder_id
+    try:
+        result = await guarded_call(
+            account, lambda: client.offline_add_urls(payload, async_=True), call='offline_add_urls', pacer=get_pacer(account)
+        )
+    except CircuitOpenError as e:
+        return [(url, False, str(e)) for url in chunk]
+    except Exception as e:
+        logger.warning("批量离线提交异常，改为逐个提交: %s", e)
+        result = None
+
+    if result is not None:
+        if not result.get("state", False) and (is_rate_limited(result) or is_login_error(result)):
+            error_msg = result.get("error_msg") or result.get("error") or "未知错误"
+            logger.warning("批量离线提交失败: 账号 %s, 原因: %s", account, error_msg)
+            return [(url, False, error_msg) for url in chunk]
+        mapped = map_offline_results(chunk, result)
+        if mapped is not None:
+            return mapped
+    return [await submit_offline_url(client, url, folder_id, account) for url in chunk]
+
+# 新建空的结果统计
+def new_results():
+    return {
+        "share": {"success": 0, "failure": 0, "skipped": 0, "reasons": []},
+        "offline": {"success": 0, "failure": 0, "skipped": 0, "reasons": [], "submitted": []}
     }
-    
-    client = P115Client(cookie)
-    
-    # 1. 处理115分享链接
+
+# 按链接类型创建进度统计
+def new_tracker(links, progress=None):
+    return ProgressTracker({
+        "share": len(links["share_links"]),
+        "offline": len(links["magnet_links"]) + len(links["ed2k_links"]) + len(links["url_links"]),
+    }, progress)
+
+# 判断是否没有提取到任何链接
+def has_no_links(links):
+    return not any(links.values())
+
+# 使用一个账号处理已分类的链接，结果累加到 results 中
+async def process_links(client, links, folder_id, results, tracker, account=None, force=False):
+    # 1. 并发处理115分享链接
     if links["share_links"]:
-        share_links = links["share_links"]
-        for link in share_links:
-            try:
-                share_code, receive_code = extract_share_info(link)
-                if share_code and receive_code:
-                    res = share_save(client, share_code, receive_code, folder_id)
-                    if res.get('state', False):
-                        results["share"]["success"] += 1
-                    else:
-                        results["share"]["failure"] += 1
-                        results["share"]["reasons"].append(f"{link}: {res.get('error', '未知错误')}")
-            except Exception as e:
-                results["share"]["failure"] += 1
-                results["share"]["reasons"].append(f"{link}: {str(e)}")
+        items = []
+        for link in links["share_links"]:
+            share_code, receive_code = extract_share_info(link)
+            if share_code and receive_code:
+                items.append((link, share_code, receive_code))
+        share_result = await transfer_shares(
+            client, items, folder_id, account, force, lambda ok: tracker.record("share", ok)
+        )
+        tracker.skip("share", share_result["skipped"])
+        results["share"]["success"] += share_result["success"]
+        results["share"]["failure"] += share_result["failure"]
+        results["share"]["skipped"] += share_result["skipped"]
+        results["share"]["reasons"].extend(share_result["reasons"])
+        results["share"]["rate"] = share_result["rate"]
     
-    # 2. 处理HTTP/HTTPS/FTP链接
-    url_links = links["url_links"]
-    if url_links:
-        try:
-            payload = {}
-            if len(url_links) == 1:
-                payload["url"] = url_links[0]
-                if folder_id:
-                    payload["wp_path_id"] = folder_id
-                result = await client.offline_add_url(payload, async_=True)
-            else:
-                for i, url in enumerate(url_links):
-                    payload[f"url[{i}]"] = url
-                if folder_id:
-                    payload["wp_path_id"] = folder_id
-                result = await client.offline_add_urls(payload, async_=True)
-                
-            if result.get("state", False):
-                results["offline"]["success"] += len(url_links)
-            else:
-                results["offline"]["failure"] += len(url_links)
-                error_msg = result.get("error_msg", '未知错误')
-                results["offline"]["reasons"].append(f"URL链接添加失败: {error_msg}")
-        except Exception as e:
-            results["offline"]["failure"] += len(url_links)
-            results["offline"]["reasons"].append(f"URL链接添加失败: {str(e)}")
-    
-    # 3. 处理电驴链接 - 单独处理每个电驴链接
-    for ed2k in links["ed2k_links"]:
-        try:
-            print(f"正在处理电驴链接: {ed2k}")
-            
-            # 电驴链接单独处理，每个链接一个请求
-            payload = {"url": ed2k}
-            if folder_id:
-                payload["wp_path_id"] = folder_id
-                
-            # 使用最直接的API调用
-            result = await client.offline_add_url(payload, async_=True)
-            print(f"API响应: {result}")
-            
-            if result.get("state", False):
+    # 2. 磁力、电驴、HTTP/HTTPS/FTP链接合并为分块的批量离线任务
+    ledger = get_ledger()
+    kinds = {}
+    offline_links = []
+    for kind, key in (("magnet", "magnet_links"), ("ed2k", "ed2k_links")):
+        urls = links[key]
+        if not force:
+            urls, known = ledger.partition(kind, urls, account, folder_id)
+            results["offline"]["skipped"] += len(known)
+            tracker.skip("offline", len(known))
+            for url in known:
+                logger.debug("已添加过，跳过: %s", url, extra={'verbose': True})
+        for url in urls:
+            kinds[url] = kind
+        offline_links.extend(urls)
+    offline_links.extend(links["url_links"])
+
+    batch_size = get_offline_batch_size()
+    for start in range(0, len(offline_links), batch_size):
+        chunk = offline_links[start:start + batch_size]
+        saved = []
+        with span('offline_submit', account=account, links=len(chunk)):
+            outcomes = await submit_offline_chunk(client, chunk, folder_id, account)
+        for url, ok, error_msg in outcomes:
+            tracker.record("offline", ok)
+            if ok:
                 results["offline"]["success"] += 1
-                print(f"电驴链接添加成功: {ed2k}")
+                results["offline"]["submitted"].append(url)
+                if url in kinds:
+                    saved.append((kinds[url], ledger_key(kinds[url], url)))
+                logger.debug("离线链接添加成功: %s", url, extra={'verbose': True})
             else:
                 results["offline"]["failure"] += 1
-                error_msg = result.get("error_msg", "未知错误")
-                results["offline"]["reasons"].append(f"电驴链接添加失败: {error_msg}")
-                print(f"电驴链接添加失败: {ed2k}, 原因: {error_msg}")
-        except Exception as e:
-            results["offline"]["failure"] += 1
-            results["offline"]["reasons"].append(f"电驴链接添加失败: {str(e)}")
-            print(f"电驴链接添加失败(异常): {ed2k}, 错误: {str(e)}")
+                results["offline"]["reasons"].append(f"{url}: {error_msg}")
+                logger.info("离线链接添加失败: %s, 原因: %s", url, error_msg, extra={'verbose': True})
+        ledger.record(saved, account, folder_id)
+
+    if offline_links:
+        logger.info(
+            "离线任务提交完成: 账号 %s, 成功 %d, 失败 %d, 跳过 %d", account,
+            results["offline"]["success"], results["offline"]["failure"], results["offline"]["skipped"]
+        )
+
+# 混合处理所有类型链接
+# force=True 时忽略已转存记录，强制重新提交；progress 为进度回调，接收各类型的进度快照
+async def process_mixed_links(cookie, content, folder_id, entities=None, account=None, force=False, progress=None):
+    # 提取并分类所有链接
+    with span('extract_links'):
+        links = extract_all_links(content, entities)
+    tracker = new_tracker(links, progress)
+    results = new_results()
     
-    # 4. 处理磁力链接
-    for magnet in links["magnet_links"]:
-        try:
-            print(f"正在处理磁力链接: {magnet}")
-            payload = {"url": magnet}
-            if folder_id:
-                payload["wp_path_id"] = folder_id
-                
-            result = await client.offline_add_url(payload, async_=True)
-            
-            if result.get("state", False):
-                results["offline"]["success"] += 1
-                print(f"磁力链接添加成功: {magnet}")
-            else:
-                results["offline"]["failure"] += 1
-                error_msg = result.get("error_msg", "未知错误")
-                results["offline"]["reasons"].append(f"{magnet}: {error_msg}")
-                print(f"磁力链接添加失败: {magnet}, 原因: {error_msg}")
-        except Exception as e:
-            results["offline"]["failure"] += 1
-            results["offline"]["reasons"].append(f"{magnet}: {str(e)}")
-            print(f"磁力链接添加失败(异常): {magnet}, 错误: {str(e)}")
+    client = get_client(cookie, account)
+    await process_links(client, links, folder_id, results, tracker, account, force)
     
     # 确保即使没有链接也显示结果
-    if not links["share_links"] and not links["url_links"] and not links["magnet_links"] and not links["ed2k_links"]:
+    if has_no_links(links):
         results["offline"]["reasons"].append("未找到任何有效链接")
     
+    observe_link_results(results)
+    return results
+
+# 将链接分散到账号池中的多个账号处理，targets 为 [(账号, cookie, 目录ID)]
+async def process_pool_links(targets, content, entities=None, force=False, progress=None):
+    with span('extract_links'):
+        links = extract_all_links(content, entities)
+    tracker = new_tracker(links, progress)
+    results = new_results()
+    results["accounts"] = {}
+
+    # 按策略把每个链接分配给一个账号
+    accounts = [account for account, _, _ in targets]
+    picker = make_picker(accounts, get_config().get('pool_strategy', 'weighted'))
+    assigned = {account: {key: [] for key in links} for account in accounts}
+    for key, urls in links.items():
+        for url in urls:
+            assigned[picker.pick()][key].append(url)
+
+    async def run(account, cookie, folder_id):
+        account_results = new_results()
+        start = time.perf_counter()
+        await process_links(get_client(cookie, account), assigned[account], folder_id, account_results, tracker, account, force)
+        elapsed = time.perf_counter() - start
+
+        # 记录账号的平均耗时和错误率，用于后续批次的分配权重
+        processed = sum(account_results[kind]["success"] + account_results[kind]["failure"] for kind in ("share", "offline"))
+        if processed:
+            failures = account_results["share"]["failure"] + account_results["offline"]["failure"]
+            get_account_stats(account).observe(elapsed / processed, failures / processed)
+        return account, account_results
+
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run(*target) for target in targets))
+    elapsed = time.perf_counter() - start
+
+    for account, account_results in outcomes:
+        for kind in ("share", "offline"):
+            for field in ("success", "failure", "skipped"):
+                results[kind][field] += account_results[kind][field]
+            results[kind]["reasons"].extend(account_results[kind]["reasons"])
+        if any(account_results[kind][field] for kind in ("share", "offline") for field in ("success", "failure", "skipped")):
+            results["accounts"][account] = account_results
+
+    shares = results["share"]["success"] + results["share"]["failure"]
+    if shares and elapsed > 0:
+        results["share"]["rate"] = shares / elapsed
+
+    if has_no_links(links):
+        results["offline"]["reasons"].append("未找到任何有效链接")
+
+    observe_link_results(results)
     return results
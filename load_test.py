@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import tempfile
+import time
+
+from config_utils import flush_config, save_config
+from api_guard import guard_stats
+from job_queue import get_job_queue
+from log_utils import setup_logging
+from mock_115 import Mock115Backend
+from p115_transfer import client_stats, set_client_factory
+from telegram_bot import handle_message, handle_mixed, run_link_job
+
+# 压测使用的用户 ID
+USER_ID = 10000
+
+# 事件循环延迟的采样间隔（秒），超过该间隔的部分计为阻塞时间
+LAG_INTERVAL = 0.01
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+# 模拟的 Telegram 用户、消息和按钮回调，只实现处理函数用到的属性
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, message_id, text=None, reply_markup=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.caption = None
+        self.entities = []
+        self.caption_entities = []
+        self.document = None
+        self.reply_markup = reply_markup
+        self.from_user = FakeUser(USER_ID)
+        self.replies = []
+
+    async def reply_text(self, text, reply_markup=None, **kwargs):
+        reply = await self.bot.send_message(self.chat_id, text, reply_markup=reply_markup)
+        self.replies.append(reply)
+        return reply
+
+class FakeCallbackQuery:
+    def __init__(self, message, data):
+        self.message = message
+        self.data = data
+        self.from_user = FakeUser(USER_ID)
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        return await self.message.bot.edit_message_text(
+            text, chat_id=self.message.chat_id, message_id=self.message.message_id, reply_markup=reply_markup, **kwargs
+        )
+
+    async def answer(self, text=None, **kwargs):
+        pass
+
+class FakeUpdate:
+    def __init__(self, message=None, callback_query=None):
+        self.message = message
+        self.callback_query = callback_query
+
+class FakeContext:
+    def __init__(self, bot):
+        self.bot = bot
+        self.user_data = {}
+
+# 模拟的 Bot：记录发送和编辑的消息；任务队列以 Markdown 写入最终结果，据此判断任务完成
+class FakeBot:
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._messages = {}
+        self._done = {}
+        self.sent = 0
+        self.edits = 0
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.sent += 1
+        message = FakeMessage(self, chat_id, next(self._ids), text, reply_markup)
+        self._messages[message.message_id] = message
+        return message
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, reply_markup=None, parse_mode=None, **kwargs):
+        self.edits += 1
+        message = self._messages[message_id]
+        message.text = text
+        message.reply_markup = reply_markup
+        if parse_mode == 'Markdown':
+            self._result(message_id).set_result(text)
+        return message
+
+    def _result(self, message_id):
+        future = self._done.get(message_id)
+        if future is None:
+            future = self._done[message_id] = asyncio.get_running_loop().create_future()
+        return future
+
+    # 等待消息被写入最终结果
+    async def wait_result(self, message_id):
+        return await self._result(message_id)
+
+# 事件循环延迟监测：定期 sleep，实际醒来时间比预期晚的部分即事件循环被阻塞的时间
+class LoopMonitor:
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.lags = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+# 生成一条包含 links 个链接的消息，share_ratio 为分享链接的比例，其余为磁力链接
+def make_message(rng, links, share_ratio):
+    lines = []
+    for _ in range(links):
+        token = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(11))
+        if rng.random() < share_ratio:
+            lines.append(f"https://115.com/s/{token}?password={token[:4]}")
+        else:
+            lines.append(f"magnet:?xt=urn:btih:{rng.getrandbits(160):040x}&dn={token}")
+    return "\n".join(lines)
+
+def make_config(accounts):
+    cookies = {
+        f"账号{i}": {"cookie": f"UID={i}_mock; CID={i:032x}", "cid": {"目录": str(3000000000000000000 + i)}}
+        for i in range(accounts)
+    }
+    return {"tg_token": "0:load", "bound_user_id": str(USER_ID), "cookies": cookies}
+
+# 从按钮中选择与 label 匹配的回调数据
+def find_button(message, label):
+    for row in message.reply_markup.inline_keyboard:
+        for button in row:
+            if button.text.startswith(label):
+                return button.callback_data
+    raise LookupError(f"未找到按钮: {label}")
+
+# 驱动一条消息走完整个处理流程，返回端到端耗时
+async def drive_message(bot, chat_id, text, account):
+    context = FakeContext(bot)
+    start = time.perf_counter()
+    message = FakeMessage(bot, chat_id, 0, text)
+    await handle_message(FakeUpdate(message=message), context)
+    if not message.replies:
+        raise RuntimeError("handle_message 没有回复")
+    reply = message.replies[-1]
+
+    # 多账号时点击账号按钮
+    if reply.reply_markup is not None:
+        query = FakeCallbackQuery(reply, find_button(reply, account))
+        await handle_mixed(FakeUpdate(callback_query=query), context)
+
+    await bot.wait_result(reply.message_id)
+    return time.perf_counter() - start
+
+async def run_load(args):
+    bot = FakeBot()
+    backend = Mock115Backend(args.latency, args.jitter, args.error_rate, args.dead_rate, args.rate_limit, args.seed)
+    set_client_factory(backend.client)
+
+    queue = get_job_queue()
+    await queue.start(bot, run_link_job, args.workers)
+    monitor = LoopMonitor()
+    monitor.start()
+
+    rng = random.Random(args.seed)
+    accounts = ["账号池"] if args.pool else [f"账号{i}" for i in range(args.accounts)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i):
+        text = make_message(rng, args.links, args.share_ratio)
+        async with semaphore:
+            latencies.append(await drive_message(bot, 1000 + i, text, accounts[i % len(accounts)]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.messages)))
+    elapsed = time.perf_counter() - start
+
+    await monitor.stop()
+    await queue.stop()
+    return elapsed, latencies, monitor.lags, backend, bot
+
+def report(args, elapsed, latencies, lags, backend, bot):
+    total_links = args.messages * args.links
+    blocked = sum(lags)
+    print(f"[load] {args.messages} 条消息 x {args.links} 个链接，{args.accounts} 个账号{'（账号池）' if args.pool else ''}，"
+          f"并发 {args.concurrency}，{args.workers} 个工作协程")
+    print(f"  总耗时:       {elapsed:9.2f} s")
+    print(f"  吞吐量:       {args.messages / elapsed:9.2f} 条消息/秒  {total_links / elapsed:9.1f} 个链接/秒")
+    print(f"  端到端延迟:   p50 {_percentile(latencies, 0.5) * 1e3:8.1f} ms  p99 {_percentile(latencies, 0.99) * 1e3:8.1f} ms"
+          f"  max {max(latencies) * 1e3:8.1f} ms")
+    print(f"  事件循环延迟: p99 {_percentile(lags, 0.99) * 1e3:8.1f} ms  max {max(lags, default=0.0) * 1e3:8.1f} ms"
+          f"  累计阻塞 {blocked:6.2f} s ({blocked / elapsed * 100:.1f}%)")
+    print(f"  115 接口调用: {dict(backend.calls)}  注入错误: {dict(backend.errors)}")
+    stats = guard_stats()
+    print(f"  重试 {stats['retries']} 次，熔断 {stats['trips']} 次，Telegram 发送 {bot.sent} 条、编辑 {bot.edits} 次")
+    clients = client_stats()
+    print(f"  客户端复用率: {clients['reuse_ratio'] * 100:.1f}%（新建 {clients['misses']} 个，重建 {clients['rebuilds']} 次）")
+
+def main():
+    parser = argparse.ArgumentParser(description="115zcbot 端到端压测（模拟 115 接口和 Telegram 更新）")
+    parser.add_argument("--messages", type=int, default=200, help="消息数，默认 200")
+    parser.add_argument("--links", type=int, default=10, help="每条消息的链接数，默认 10")
+    parser.add_argument("--share-ratio", type=float, default=0.5, help="分享链接占比，其余为磁力链接，默认 0.5")
+    parser.add_argument("--accounts", type=int, default=1, help="账号数，多于 1 个时通过账号按钮选择，默认 1")
+    parser.add_argument("--pool", action="store_true", help="多账号时使用账号池")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时在处理中的消息数，默认 20")
+    parser.add_argument("--workers", type=int, default=4, help="任务队列工作协程数，默认 4")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟接口的平均响应时间（秒），默认 0.05")
+    parser.add_argument("--jitter", type=float, default=0.5, help="响应时间的相对抖动，默认 0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="临时错误比例，默认 0")
+    parser.add_argument("--dead-rate", type=float, default=0.0, help="失效分享比例，默认 0")
+    parser.add_argument("--rate-limit", type=float, default=None, help="每个账号每秒允许的请求数，默认不限流")
+    parser.add_argument("--seed", type=int, default=115)
+    args = parser.parse_args()
+    if args.pool and args.accounts < 2:
+        parser.error("账号池需要至少 2 个账号")
+
+    setup_logging({"level": "WARNING"})
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # 配置、任务队列和转存记录都写入临时目录
+        os.chdir(tmp)
+        try:
+            save_config(make_config(args.accounts))
+            flush_config()
+            results = asyncio.run(run_load(args))
+            get_job_queue().close()
+            flush_config()
+        finally:
+            os.chdir(cwd)
+    report(args, *results)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
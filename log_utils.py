@@ -0,0 +1,130 @@
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# 默认日志级别
+DEFAULT_LEVEL = 'INFO'
+
+# 每秒最多输出的逐条链接日志数，超出的部分只记录被省略的数量
+DEFAULT_VERBOSE_LIMIT = 20
+
+# 日志队列的容量，队列满时丢弃日志而不是阻塞处理流程
+QUEUE_SIZE = 10000
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(name)s]%(job_tag)s %(message)s'
+
+# 当前任务的关联 ID，随 asyncio 任务上下文传递
+_correlation_id = contextvars.ContextVar('correlation_id', default=None)
+
+# 设置当前上下文的关联 ID，返回用于恢复的 token
+def set_correlation_id(value):
+    return _correlation_id.set(value)
+
+def reset_correlation_id(token):
+    _correlation_id.reset(token)
+
+def get_correlation_id():
+    return _correlation_id.get()
+
+# 为日志记录附加关联 ID，需要在入队前（处理流程所在的上下文中）执行
+class CorrelationFilter(logging.Filter):
+    def filter(self, record):
+        record.job = _correlation_id.get()
+        record.job_tag = f" [{record.job}]" if record.job else ""
+        return True
+
+# 逐条链接日志的限流：extra={'verbose': True} 的日志每秒最多输出 limit 条
+class VerboseRateLimit(logging.Filter):
+    def __init__(self, limit=DEFAULT_VERBOSE_LIMIT):
+        super().__init__()
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._window = 0
+        self._count = 0
+        self._dropped = 0
+
+    def filter(self, record):
+        if not getattr(record, 'verbose', False):
+            return True
+        window = int(time.monotonic())
+        with self._lock:
+            if window != self._window:
+                if self._dropped:
+                    record.msg = f"{record.msg}（此前 1 秒内省略了 {self._dropped} 条逐条日志）"
+                self._window = window
+                self._count = 0
+                self._dropped = 0
+            if self._count >= self.limit:
+                self._dropped += 1
+                return False
+            self._count += 1
+            return True
+
+# 单行 JSON 格式，便于日志系统采集
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, 'job', None):
+            entry["job"] = record.job
+        return json.dumps(entry, ensure_ascii=False)
+
+# 队列满时丢弃日志，避免阻塞事件循环
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+_listener = None
+
+# 按配置初始化日志：处理流程只把日志放入队列，由后台线程格式化和写出
+def setup_logging(settings=None):
+    global _listener
+    settings = settings or {}
+    if _listener is not None:
+        return
+
+    if settings.get('format') == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if settings.get('file'):
+        handlers.append(logging.FileHandler(settings['file'], encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+    queue_handler.addFilter(VerboseRateLimit(int(settings.get('verbose_limit', DEFAULT_VERBOSE_LIMIT))))
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(str(settings.get('level', DEFAULT_LEVEL)).upper())
+    # HTTP 库每个请求都会输出 INFO 日志，默认只保留警告
+    for name in ('httpx', 'httpcore'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+# 停止后台日志线程，写出队列中剩余的日志
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
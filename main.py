@@ -1,29 +1,52 @@
 import asyncio
+import logging
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 
 from config_utils import load_config
+from log_utils import setup_logging
+from metrics import start_metrics_server
+from tracing import configure as configure_tracing
 from telegram_bot import (
-    start, set_115, bind, unbind, handle_message, 
-    handle_transfer, handle_offline, handle_mixed, handle_interaction, handle_error, set_commands
+    start, set_115, bind, unbind, force, handle_message, 
+    handle_transfer, handle_offline, handle_mixed, handle_interaction, handle_error, set_commands,
+    start_workers, stop_workers
 )
 
+logger = logging.getLogger(__name__)
+
 def main():
     # 加载配置
     config = load_config()
+    setup_logging(config.get('logging'))
     tg_token = config.get('tg_token')
     
     if not tg_token:
-        print("错误: 未设置Telegram机器人令牌，请在config.json中设置tg_token")
+        logger.error("未设置Telegram机器人令牌，请在config.json中设置tg_token")
         return
     
+    # 启动可选的指标端点
+    start_metrics_server(config.get('metrics') or {})
+
+    # 可选的慢更新追踪和性能分析
+    configure_tracing(config.get('tracing') or {})
+
     # 创建应用
-    application = Application.builder().token(tg_token).build()
+    application = (
+        Application.builder()
+        .token(tg_token)
+        # 并发处理更新，多个批次可以同时选择目录和处理
+        .concurrent_updates(config.get('concurrent_updates', True))
+        .post_init(start_workers)
+        .post_shutdown(stop_workers)
+        .build()
+    )
 
     # 添加处理程序
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('115set', set_115))
     application.add_handler(CommandHandler('bind', bind))
     application.add_handler(CommandHandler('unbind', unbind))
+    application.add_handler(CommandHandler('force', force))
     application.add_handler(MessageHandler(filters.ALL, handle_message))
     application.add_handler(CallbackQueryHandler(handle_transfer, pattern=r'^transfer_'))
     application.add_handler(CallbackQueryHandler(handle_offline, pattern=r'^offline_'))
@@ -39,8 +62,30 @@ def main():
     loop.run_until_complete(set_commands(application))
 
     # 启动 bot
-    print("机器人已启动...")
-    application.run_polling()
+    webhook = config.get('webhook') or {}
+    if webhook.get('enabled'):
+        run_webhook(application, webhook)
+    else:
+        logger.info("机器人已启动(轮询模式)...")
+        application.run_polling()
+
+# 以 Webhook 模式运行：由内置的 HTTP 服务器接收 Telegram 推送的更新
+def run_webhook(application, webhook):
+    listen = webhook.get('listen', '0.0.0.0')
+    port = int(webhook.get('port', 8443))
+    url_path = webhook.get('url_path', 'telegram').strip('/')
+
+    logger.info("机器人已启动(Webhook 模式)，监听 %s:%s/%s", listen, port, url_path)
+    application.run_webhook(
+        listen=listen,
+        port=port,
+        url_path=url_path,
+        webhook_url=webhook.get('webhook_url'),
+        secret_token=webhook.get('secret_token'),
+        max_connections=int(webhook.get('max_connections', 40)),
+        cert=webhook.get('cert'),
+        key=webhook.get('key'),
+    )
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,228 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 延迟直方图的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 指标端点的默认监听地址
+DEFAULT_LISTEN = '127.0.0.1'
+DEFAULT_PORT = 9115
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# 已注册的指标：{名称: 指标}，按注册顺序输出
+_registry = {}
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + body + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# 计数器：只增不减，按标签分别计数
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with _lock:
+            items = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value) for labels, value in items]
+
+# 直方图：记录耗时分布，输出累计分桶、总和与次数
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values = {}
+
+    def observe(self, value, *labels):
+        with _lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    # 计时上下文，退出时记录耗时
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with _lock:
+            items = [(labels, list(entry[0]), entry[1], entry[2]) for labels, entry in self._values.items()]
+        samples = []
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = (('le', _format_value(bound)),)
+                samples.append((self.name + '_bucket', _format_labels(self.labelnames, labels, le), cumulative))
+            samples.append((self.name + '_sum', _format_labels(self.labelnames, labels), total))
+            samples.append((self.name + '_count', _format_labels(self.labelnames, labels), count))
+        return samples
+
+# 采集时才取值的仪表，如队列深度
+class CallbackGauge:
+    type = 'gauge'
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [(self.name, '', value)]
+
+def _register(metric):
+    with _lock:
+        _registry[metric.name] = metric
+    return metric
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter(name, documentation, labelnames))
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+# 注册采集时回调取值的仪表，同名仪表会被替换
+def gauge_callback(name, documentation, callback):
+    return _register(CallbackGauge(name, documentation, callback))
+
+# 115 API 调用
+API_CALLS = counter('zcbot_api_calls_total', '115 API calls by call type and outcome', ('call', 'outcome'))
+API_LATENCY = histogram('zcbot_api_call_seconds', '115 API call latency by call type', ('call',))
+
+# 链接处理结果
+LINK_RESULTS = counter('zcbot_links_total', 'Processed links by link type and outcome', ('kind', 'outcome'))
+
+# Telegram 处理函数耗时
+HANDLER_LATENCY = histogram('zcbot_handler_seconds', 'Telegram handler latency', ('handler',))
+HANDLER_ERRORS = counter('zcbot_handler_errors_total', 'Telegram handler exceptions', ('handler',))
+
+# 配置文件读写耗时
+CONFIG_LATENCY = histogram('zcbot_config_seconds', 'Config file read/write latency', ('op',))
+
+# 重试和熔断事件（calls、retries、failures、throttled、trips、circuit_waits、rejected）
+GUARD_EVENTS = counter('zcbot_api_guard_events_total', '115 API retry and circuit breaker events', ('event',))
+
+# 账号客户端注册表的查找结果（hit 为复用已有客户端）
+CLIENT_LOOKUPS = counter('zcbot_client_lookups_total', '115 client registry lookups by result', ('result',))
+
+# 记录一次 115 API 调用的结果，res 为 115 的返回或 None（抛出异常）
+def observe_api(call, elapsed, res):
+    if res is None:
+        outcome = 'exception'
+    elif not isinstance(res, dict) or res.get('state', False):
+        outcome = 'ok'
+    else:
+        outcome = 'error'
+    API_CALLS.inc(call, outcome)
+    API_LATENCY.observe(elapsed, call)
+
+# 按链接类型记录处理结果，results 为 link_processor 的结果统计
+def observe_link_results(results):
+    for kind in ('share', 'offline'):
+        for outcome in ('success', 'failure', 'skipped'):
+            count = results[kind][outcome]
+            if count:
+                LINK_RESULTS.inc(kind, outcome, amount=count)
+
+# 处理函数计时装饰器
+def track_handler(name):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_LATENCY.observe(time.perf_counter() - start, name)
+        return wrapper
+    return decorator
+
+# 以 Prometheus 文本格式输出所有指标
+def render():
+    with _lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            lines.append(f'{name}{labels} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+
+# 按配置在后台线程启动指标端点，settings 为配置中的 metrics 项
+def start_metrics_server(settings):
+    global _server
+    if _server is not None or not settings.get('enabled'):
+        return _server
+    listen = settings.get('listen', DEFAULT_LISTEN)
+    port = int(settings.get('port', DEFAULT_PORT))
+    _server = ThreadingHTTPServer((listen, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    logger.info("指标端点已启动: http://%s:%s/metrics", listen, port)
+    return _server
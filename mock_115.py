@@ -0,0 +1,183 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+
+# 限流时返回的错误信息
+RATE_LIMIT_ERROR = "操作过于频繁，请稍后再试"
+
+# 随机注入的临时错误
+TRANSIENT_ERROR = "服务器繁忙"
+
+# 已失效分享的错误信息
+DEAD_SHARE_ERROR = "分享已取消"
+
+# 离线任务从提交到完成的时间（秒）
+OFFLINE_TASK_DURATION = 1.0
+
+# 离线列表每页的任务数
+OFFLINE_PAGE_SIZE = 30
+
+# 令牌桶：每秒补充 rate 个令牌，最多积累 burst 个
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+# 模拟的 115 服务端：按配置注入延迟、临时错误、失效分享和账号级限流
+# latency 为平均响应时间（秒），jitter 为相对抖动比例，rate_limit 为每个账号每秒允许的请求数
+class Mock115Backend:
+    def __init__(self, latency=0.05, jitter=0.5, error_rate=0.0, dead_rate=0.0, rate_limit=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.dead_rate = dead_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.errors = Counter()
+        self._buckets = {}
+        # 已失效的 cookie
+        self.expired = set()
+        # {cookie: {url: 提交时间}}，最新提交的排在离线列表最前面
+        self._offline = {}
+
+    # 客户端工厂，可直接传给 p115_transfer.set_client_factory
+    def client(self, cookie):
+        return Mock115Client(self, cookie)
+
+    def _delay(self):
+        spread = self.latency * self.jitter
+        return max(0.0, self.random.uniform(self.latency - spread, self.latency + spread))
+
+    # 检查限流和随机临时错误，返回错误响应或 None
+    def _check(self, call, cookie):
+        self.calls[call] += 1
+        if self.rate_limit:
+            bucket = self._buckets.get(cookie)
+            if bucket is None:
+                bucket = self._buckets[cookie] = TokenBucket(self.rate_limit)
+            if not bucket.take():
+                self.errors["rate_limited"] += 1
+                return {"state": False, "error": RATE_LIMIT_ERROR, "error_msg": RATE_LIMIT_ERROR}
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors["transient"] += 1
+            return {"state": False, "error": TRANSIENT_ERROR, "error_msg": TRANSIENT_ERROR}
+        return None
+
+    def _is_dead(self, share_code):
+        # 同一分享每次的结果保持一致
+        return self.dead_rate and random.Random(share_code).random() < self.dead_rate
+
+    def share_snap(self, cookie, payload):
+        error = self._check("share_snap", cookie)
+        if error is not None:
+            return error
+        if self._is_dead(payload["share_code"]):
+            return {"state": False, "error": DEAD_SHARE_ERROR}
+        return {"state": True, "data": {"count": 1, "list": []}}
+
+    def share_receive(self, cookie, payload):
+        error = self._check("share_receive", cookie)
+        if error is not None:
+            return error
+        if self._is_dead(payload["share_code"]):
+            return {"state": False, "error": DEAD_SHARE_ERROR}
+        return {"state": True}
+
+    def offline_add_url(self, cookie, payload):
+        error = self._check("offline_add_url", cookie)
+        if error is not None:
+            return error
+        self._add_offline(cookie, [payload["url"]])
+        return {"state": True, "url": payload["url"]}
+
+    def offline_add_urls(self, cookie, payload):
+        error = self._check("offline_add_urls", cookie)
+        if error is not None:
+            return error
+        urls = [value for key, value in payload.items() if key.startswith("url[")]
+        self._add_offline(cookie, urls)
+        return {"state": True, "result": [{"state": True, "url": url} for url in urls]}
+
+    def _add_offline(self, cookie, urls):
+        tasks = self._offline.setdefault(cookie, {})
+        now = time.monotonic()
+        for url in urls:
+            tasks[url] = now
+
+    # 离线任务列表：提交满 OFFLINE_TASK_DURATION 秒后完成，失效比例 dead_rate 的任务失败
+    def offline_list(self, cookie, payload):
+        error = self._check("offline_list", cookie)
+        if error is not None:
+            return error
+        page = payload.get("page", 1) if isinstance(payload, dict) else payload
+        tasks = list(reversed(self._offline.get(cookie, {}).items()))
+        page_count = max(1, -(-len(tasks) // OFFLINE_PAGE_SIZE))
+        now = time.monotonic()
+        result = []
+        for url, submitted in tasks[(page - 1) * OFFLINE_PAGE_SIZE:page * OFFLINE_PAGE_SIZE]:
+            if now - submitted < OFFLINE_TASK_DURATION:
+                status = 1
+            else:
+                status = -1 if self._is_dead(url) else 2
+            result.append({"url": url, "name": url[:60], "status": status})
+        return {"state": True, "page": page, "page_count": page_count, "count": len(tasks), "tasks": result}
+
+    def get_user_info(self, cookie, payload=None):
+        error = self._check("get_user_info", cookie)
+        if error is not None:
+            return error
+        if cookie in self.expired:
+            return {"state": False, "errno": 99, "error": "登录超时，请重新登录"}
+        return {"state": True, "data": {"user_name": f"mock_{abs(hash(cookie)) % 10000}"}}
+
+# 模拟的 P115Client，只实现本项目用到的接口；async_=True 时返回协程
+class Mock115Client:
+    def __init__(self, backend, cookie):
+        self.backend = backend
+        self.cookie = cookie
+
+    def _call(self, name, payload, async_):
+        handler = getattr(self.backend, name)
+        delay = self.backend._delay()
+        if not async_:
+            time.sleep(delay)
+            return handler(self.cookie, payload)
+
+        async def call():
+            await asyncio.sleep(delay)
+            return handler(self.cookie, payload)
+        return call()
+
+    def share_snap(self, payload, async_=False):
+        return self._call("share_snap", payload, async_)
+
+    def share_receive(self, payload, async_=False):
+        return self._call("share_receive", payload, async_)
+
+    def offline_add_url(self, payload, async_=False):
+        return self._call("offline_add_url", payload, async_)
+
+    def offline_add_urls(self, payload, async_=False):
+        return self._call("offline_add_urls", payload, async_)
+
+    def offline_list(self, payload=1, async_=False):
+        return self._call("offline_list", payload, async_)
+
+    def get_user_info(self, async_=False):
+        return self._call("get_user_info", None, async_)
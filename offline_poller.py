@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from api_guard import guarded_call
+from config_utils import get_config
+from ledger import magnet_btih
+from p115_transfer import get_client
+
+logger = logging.getLogger(__name__)
+
+# 离线任务跟踪数据库路径
+OFFLINE_TASKS_FILE = 'offline_tasks.db'
+
+# 轮询间隔的上下限（秒），跟踪的任务越多轮询越频繁
+MIN_INTERVAL = 30.0
+MAX_INTERVAL = 300.0
+
+# 每个账号每轮最多查询的离线列表页数
+MAX_PAGES = 5
+
+# 超过该时间仍未完成的任务不再跟踪
+TASK_TTL = 7 * 24 * 3600
+
+# 115 离线任务状态：2 为已完成，-1 为失败，其余为等待或下载中
+STATUS_DONE = 2
+STATUS_FAILED = -1
+
+# 通知中最多列出的任务名称数
+NOTIFY_LIMIT = 20
+
+# 已提交的离线任务：记录提交的账号和需要通知的聊天，完成或失败后删除
+class OfflineTaskStore:
+    def __init__(self, path=OFFLINE_TASKS_FILE):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " account TEXT NOT NULL,"
+            " chat_id INTEGER NOT NULL,"
+            " url TEXT NOT NULL,"
+            " info_hash TEXT,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def add(self, account, chat_id, urls):
+        now = time.time()
+        rows = [(account, chat_id, url, magnet_btih(url), now) for url in urls]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO tasks (account, chat_id, url, info_hash, created_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def active(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tasks ORDER BY id").fetchall()
+        return [dict(row) for row in rows]
+
+    def remove(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM tasks WHERE id=?", [(task_id,) for task_id in ids])
+            self._conn.commit()
+
+    # 删除过期的任务，返回删除的数量
+    def expire(self, before):
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM tasks WHERE created_at < ?", (before,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# 根据跟踪中的任务数计算轮询间隔
+def poll_interval(active, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL):
+    if active <= 0:
+        return max_interval
+    return max(min_interval, min(max_interval, max_interval / active))
+
+# 在离线列表中查找跟踪的任务：磁力链接按 info_hash 匹配，其他按 URL 匹配
+def match_task(row, by_hash, by_url):
+    if row["info_hash"] and row["info_hash"] in by_hash:
+        return by_hash[row["info_hash"]]
+    return by_url.get(row["url"])
+
+def format_notification(done, failed):
+    lines = []
+    for title, names in (("离线任务已完成", done), ("离线任务失败", failed)):
+        if not names:
+            continue
+        lines.append(f"{title} ({len(names)}):")
+        lines.extend(f"- {name}" for name in names[:NOTIFY_LIMIT])
+        if len(names) > NOTIFY_LIMIT:
+            lines.append(f"... 等 {len(names)} 个")
+    return "\n".join(lines)
+
+# 离线任务轮询：每个账号每轮只查询一次离线列表（必要时翻页），任务完成或失败时通知提交者
+class OfflinePoller:
+    def __init__(self, store=None):
+        self.store = store or OfflineTaskStore()
+        self._task = None
+        self._wakeup = None
+
+    # 是否开启离线任务完成通知
+    @staticmethod
+    def is_enabled():
+        return bool(get_config().get('offline_notify', True))
+
+    # 跟踪新提交的离线任务
+    def track(self, account, chat_id, urls):
+        if not urls or not self.is_enabled():
+            return
+        self.store.add(account, chat_id, urls)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, bot):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _intervals(self):
+        config = get_config()
+        try:
+            return (float(config.get('offline_poll_min_interval', MIN_INTERVAL)),
+                    float(config.get('offline_poll_max_interval', MAX_INTERVAL)))
+        except (TypeError, ValueError):
+            return MIN_INTERVAL, MAX_INTERVAL
+
+    async def _run(self, bot):
+        while True:
+            active = self.store.active()
+            if not active:
+                # 没有跟踪的任务时等待新任务，不发出请求
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await asyncio.sleep(poll_interval(len(active), *self._intervals()))
+            try:
+                await self.poll_once(bot)
+            except Exception:
+                logger.exception("轮询离线任务失败")
+
+    # 查询一轮所有账号的离线任务状态并发送通知
+    async def poll_once(self, bot):
+        expired = self.store.expire(time.time() - TASK_TTL)
+        if expired:
+            logger.info("%d 个离线任务超过 %d 天未完成，不再跟踪", expired, TASK_TTL // 86400)
+
+        by_account = {}
+        for row in self.store.active():
+            by_account.setdefault(row["account"], []).append(row)
+
+        outcomes = await asyncio.gather(*(self._poll_account(account, rows) for account, rows in by_account.items()))
+
+        notifications = {}
+        for finished in outcomes:
+            for row, task, ok in finished:
+                entry = notifications.setdefault(row["chat_id"], ([], []))
+                entry[0 if ok else 1].append(task.get("name") or row["url"])
+        for chat_id, (done, failed) in notifications.items():
+            try:
+                await bot.send_message(chat_id, format_notification(done, failed))
+            except Exception as e:
+                logger.warning("发送离线任务通知失败: %s", e)
+
+    # 查询一个账号的离线列表，返回已结束的任务 [(跟踪记录, 115 任务, 是否成功)]
+    async def _poll_account(self, account, rows):
+        account_data = get_config().get('cookies', {}).get(account)
+        if account_data is None:
+            # 账号已删除，无法继续跟踪
+            self.store.remove([row["id"] for row in rows])
+            return []
+
+        client = get_client(account_data["cookie"], account)
+        pending = {row["id"]: row for row in rows}
+        finished = []
+        for page in range(1, MAX_PAGES + 1):
+            try:
+                res = await guarded_call(
+                    account, lambda: client.offline_list({"page": page}, async_=True), call='offline_list'
+                )
+            except Exception as e:
+                logger.warning("查询账号 %s 的离线任务失败: %s", account, e)
+                break
+            if not res.get("state", False):
+                logger.warning("查询账号 %s 的离线任务失败: %s", account, res.get("error_msg") or res.get("error"))
+                break
+
+            tasks = res.get("tasks") or []
+            by_hash = {str(task.get("info_hash", "")).lower(): task for task in tasks if task.get("info_hash")}
+            by_url = {task.get("url"): task for task in tasks if task.get("url")}
+            for task_id, row in list(pending.items()):
+                task = match_task(row, by_hash, by_url)
+                if task is None:
+                    continue
+                status = task.get("status")
+                if status == STATUS_DONE or status == STATUS_FAILED:
+                    finished.append((row, task, status == STATUS_DONE))
+                del pending[task_id]
+
+            # 跟踪的任务都已找到，或已到最后一页
+            if not pending or page >= int(res.get("page_count") or 1):
+                break
+
+        self.store.remove([row["id"] for row, _, _ in finished])
+        return finished
+
+_poller = None
+_poller_lock = threading.Lock()
+
+# 获取进程内共享的离线任务轮询器
+def get_offline_poller():
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = OfflinePoller()
+        return _poller
@@ -1,96 +1,281 @@
-import re
+import asyncio
+import logging
+import threading
 import time
+from collections import deque
 from p115 import P115Client
 
-# 改进的分享链接提取函数
-def extract_share_info(link: str):
-    # 处理链接并提取关键信息
-    link = link.replace("#", "").replace("&", "").replace(" ", "")
-    
-    if "115.com/s/" in link or "115cdn.com/s/" in link or "anxia.com/s/" in link:
-        match = re.search(r's/(\w+)\?password=(\w+)', link)
-        if match:
-            return match.group(1), match.group(2)
-    
-    return None, None
+from api_guard import CircuitOpenError, guarded_call, is_transient_error, is_transient_response
+from config_utils import get_config
+from ledger import get_ledger
+from link_parser import extract_share_info, find_valid_links
+from metrics import CLIENT_LOOKUPS, gauge_callback
+from share_check import prevalidate_shares
+from tracing import span
 
-# 在整个文本中查找有效链接
-def find_valid_links(content: str):
-    lines = content.split('\n')
-    valid_links = []
-    
-    for line in lines:
-        # 首先检查行中是否包含关键词
-        if "115.com" in line or "115cdn.com" in line or "anxia.com" in line:
-            # 1. 首先尝试提取标准URL (带http/https)
-            urls = re.findall(r'https?://[^\s]+', line)
-            
-            # 2. 如果没找到标准URL，尝试提取无协议前缀的URL
-            if not urls:
-                # 匹配115.com或anxia.com开头的文本直到空格或行末
-                domain_matches = re.findall(r'((?:115\.com|115cdn\.com|anxia\.com)/s/[^\s]+)', line)
-                urls = ["https://" + match for match in domain_matches]
-            
-            for url in urls:
-                # 清理URL末尾可能的标点符号
-                url = url.rstrip(',.;:"\']')
-                share_code, receive_code = extract_share_info(url)
-                if share_code and receive_code:
-                    valid_links.append(url)
-    
-    return valid_links
+logger = logging.getLogger(__name__)
+
+# 账号客户端注册表：{key: (cookie, client)}，key 为账号名（未指定账号时为 cookie 本身）
+_clients = {}
+_clients_lock = threading.Lock()
+
+# 创建 115 客户端的工厂，压测时替换为模拟客户端
+_client_factory = P115Client
+
+# 每个账号默认的并发转存数
+DEFAULT_CONCURRENCY = 4
+
+# 每个账号的并发信号量和节奏控制器，跨批次共享
+_semaphores = {}
+_pacers = {}
+
+# 客户端复用统计：hits 为复用已建立连接的客户端的次数
+CLIENT_STATS = {"hits": 0, "misses": 0, "rebuilds": 0}
+
+def _count_lookup(result):
+    CLIENT_STATS[result] += 1
+    CLIENT_LOOKUPS.inc(result)
+
+# 获取账号对应的长期客户端，cookie 变化时重建，以复用 keep-alive 连接
+def get_client(cookie, account=None):
+    key = account if account is not None else cookie
+    with _clients_lock:
+        entry = _clients.get(key)
+        if entry is not None and entry[0] == cookie:
+            _count_lookup("hits")
+            return entry[1]
 
-# 改进的批量转存函数
-def batch_transfer(cookie, content, share_cid):
-    client = P115Client(cookie)
+        if entry is not None:
+            _count_lookup("rebuilds")
+        else:
+            _count_lookup("misses")
+            _prune_clients()
+
+        client = _client_factory(cookie)
+        _clients[key] = (cookie, client)
+        return client
+
+# 替换创建客户端的工厂（如 mock_115 的模拟客户端），已创建的客户端会被丢弃
+def set_client_factory(factory):
+    global _client_factory
+    with _clients_lock:
+        _client_factory = factory
+        _clients.clear()
+
+# 清理已从配置中删除或 cookie 已变更的账号客户端
+def _prune_clients():
+    accounts = get_config().get("cookies", {})
+    for key, (cookie, _) in list(_clients.items()):
+        if key == cookie:
+            continue
+        if key not in accounts or accounts[key].get("cookie") != cookie:
+            del _clients[key]
+
+# 客户端注册表统计信息
+def client_stats():
+    with _clients_lock:
+        total = CLIENT_STATS["hits"] + CLIENT_STATS["misses"] + CLIENT_STATS["rebuilds"]
+        return {
+            **CLIENT_STATS,
+            "clients": len(_clients),
+            "reuse_ratio": CLIENT_STATS["hits"] / total if total else 0.0,
+        }
+
+gauge_callback('zcbot_clients', 'Cached 115 clients in the account registry', lambda: len(_clients))
+
+# 改进的批量转存函数：并发转存，返回 (成功数, 失败数, 失败原因, 吞吐量(个/秒), 已转存过而跳过的数量)
+async def batch_transfer(cookie, content, share_cid, account=None, force=False):
+    client = get_client(cookie, account)
     
     # 查找有效链接
-    valid_links = find_valid_links(content)
+    with span('extract_links'):
+        valid_links = find_valid_links(content)
     
     if not valid_links:
-        return 0, 0, ["未在消息中找到有效的115分享链接"]
-    
-    success_count = 0
-    failure_count = 0
-    failure_reasons = []
+        return 0, 0, ["未在消息中找到有效的115分享链接"], 0.0, 0
     
+    items = []
     for link in valid_links:
         share_code, receive_code = extract_share_info(link)
-        
-        print(f"处理分享链接: {link}")
-        try:
-            res = share_save(client, share_code, receive_code, share_cid)
-            
-            if res.get('state', False):
-                success_count += 1
-                print(f"转存成功: {link}")
-                time.sleep(0.1)  # 避免请求过快
+        logger.debug("处理分享链接: %s", link, extra={'verbose': True})
+        items.append((link, share_code, receive_code))
+
+    result = await transfer_shares(client, items, share_cid, account, force)
+    return result["success"], result["failure"], result["reasons"], result["rate"], result["skipped"]
+
+# 获取账号的并发上限：优先账号级 concurrency，其次全局 share_concurrency
+def get_concurrency(account=None):
+    config = get_config()
+    account_data = config.get('cookies', {}).get(account, {}) if account else {}
+    value = account_data.get('concurrency', config.get('share_concurrency', DEFAULT_CONCURRENCY))
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return DEFAULT_CONCURRENCY
+
+# 自适应节奏控制（AIMD）：没有遇到限流前不限速；遇到限流时把速率乘性降低，之后每次成功加性提高
+# 同一轮限流只降速一次（降速前已发出的请求再被限流不重复降速），学到的速率不会回到不限速
+class AdaptivePacer:
+    def __init__(self, min_rate=0.5, decrease=0.7, increase=1.0, window=1.0):
+        self.min_rate = min_rate
+        self.decrease = decrease
+        # 持续成功时每秒提高的速率（个/秒）
+        self.increase = increase
+        # 统计实际请求速率的时间窗口（秒）
+        self.window = window
+        self.rate = None
+        self._last_at = None
+        self._decreased_at = float('-inf')
+        self._starts = deque()
+
+    # 等待到允许发出请求的时间点，返回请求的开始时间
+    # 醒来时按当前速率重新计算，速率恢复后排队中的请求不会继续按旧的间隔等待
+    async def wait(self):
+        while True:
+            now = time.monotonic()
+            if self.rate is None or self._last_at is None:
+                break
+            next_at = self._last_at + 1.0 / self.rate
+            if now >= next_at:
+                break
+            await asyncio.sleep(next_at - now)
+        self._last_at = now
+        self._starts.append(now)
+        self._trim(now)
+        return now
+
+    def _trim(self, now):
+        while self._starts and self._starts[0] < now - self.window:
+            self._starts.popleft()
+
+    def on_success(self):
+        if self.rate is not None:
+            self.rate += self.increase / self.rate
+
+    # started 为被限流的请求的开始时间
+    def on_rate_limit(self, started=None):
+        if started is not None and started <= self._decreased_at:
+            return
+        now = time.monotonic()
+        self._trim(now)
+        observed = len(self._starts) / self.window
+        current = observed if self.rate is None else min(self.rate, observed or self.rate)
+        self.rate = max(self.min_rate, current * self.decrease)
+        self._decreased_at = now
+
+# 是否在转存前预检分享状态
+def is_precheck_enabled():
+    return bool(get_config().get('share_precheck', True))
+
+# 获取账号的并发信号量，并发上限或事件循环变化时重建
+def get_semaphore(account=None):
+    limit = get_concurrency(account)
+    loop = asyncio.get_running_loop()
+    entry = _semaphores.get(account)
+    if entry is None or entry[0] != limit or entry[1] is not loop:
+        entry = (limit, loop, asyncio.Semaphore(limit))
+        _semaphores[account] = entry
+    return entry[2]
+
+# 获取账号的节奏控制器
+def get_pacer(account=None):
+    pacer = _pacers.get(account)
+    if pacer is None:
+        pacer = _pacers[account] = AdaptivePacer()
+    return pacer
+
+# 并发转存分享链接，items 为 [(link, share_code, receive_code), ...]
+# 已在该账号和目录下转存过的分享会被跳过，force=True 时强制重新转存
+# on_result(ok) 在每个链接完成时调用，用于报告进度
+async def transfer_shares(client, items, share_cid, account=None, force=False, on_result=None):
+    result = {"success": 0, "failure": 0, "skipped": 0, "reasons": [], "elapsed": 0.0, "rate": 0.0}
+
+    ledger = get_ledger()
+    if not force:
+        pending = []
+        for item in items:
+            if ledger.contains("share", item[1], account, share_cid):
+                result["skipped"] += 1
+                logger.debug("已转存过，跳过: %s", item[0], extra={'verbose': True})
             else:
-                failure_count += 1
-                failure_reasons.append(f"{link}: {res.get('error', '未知错误')}")
-                print(f"转存失败: {link}, 原因: {res}")
-        except Exception as e:
-            failure_count += 1
-            failure_reasons.append(f"{link}: {str(e)}")
-            print(f"转存失败: {link}, 错误: {str(e)}")
-            
-    return success_count, failure_count, failure_reasons
-
-# 单个链接转存
-def share_save(client, share_code, receive_code, share_cid):
+                pending.append(item)
+        items = pending
+    if not items:
+        return result
+
+    total = len(items)
+    start = time.perf_counter()
+
+    # 预检分享状态，已失效的分享直接记为失败，不再提交
+    if is_precheck_enabled():
+        with span('share_precheck', account=account, links=len(items)):
+            items, dead = await prevalidate_shares(client, items, account, get_concurrency(account), get_pacer(account))
+        for (link, _, _), reason in dead:
+            result["failure"] += 1
+            result["reasons"].append(f"{link}: {reason}")
+            logger.info("分享已失效，跳过提交: %s, 原因: %s", link, reason, extra={'verbose': True})
+            if on_result is not None:
+                on_result(False)
+
+    semaphore = get_semaphore(account)
+    pacer = get_pacer(account)
+
+    async def transfer_one(link, share_code, receive_code):
+        async with semaphore:
+            with span('share_receive', account=account, link=link):
+                res = await async_share_save(client, share_code, receive_code, share_cid, account, pacer)
+        if res.get('state', False):
+            # 每个成功的分享立即记录，任务中断后恢复时不会重复转存
+            ledger.record([("share", share_code)], account, share_cid)
+            logger.debug("转存成功: %s", link, extra={'verbose': True})
+        else:
+            logger.info("转存失败: %s, 原因: %s", link, res.get('error') or res.get('error_msg') or '未知错误', extra={'verbose': True})
+        if on_result is not None:
+            on_result(res.get('state', False))
+        return link, res
+
+    outcomes = await asyncio.gather(*(transfer_one(*item) for item in items))
+    elapsed = time.perf_counter() - start
+
+    for link, res in outcomes:
+        if res.get('state', False):
+            result["success"] += 1
+        else:
+            result["failure"] += 1
+            result["reasons"].append(f"{link}: {res.get('error', '未知错误')}")
+
+    result["elapsed"] = elapsed
+    result["rate"] = total / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        "分享转存完成: 账号 %s, 成功 %d, 失败 %d, 跳过 %d, 耗时 %.2fs",
+        account, result["success"], result["failure"], result["skipped"], elapsed
+    )
+    return result
+
+# 单个链接转存（异步版本，不阻塞事件循环），临时错误会按重试策略重试，限流时由 pacer 放慢节奏
+async def async_share_save(client, share_code, receive_code, share_cid, account=None, pacer=None):
     try:
         payload = {'share_code': share_code, 'receive_code': receive_code, 'cid': share_cid}
-        res = client.share_receive(payload)
+        res = await guarded_call(
+            account, lambda: client.share_receive(payload, async_=True), call='share_receive', pacer=pacer
+        )
         return res
     except Exception as e:
         return {'error': str(e), 'state': False}
 
-# 验证Cookie是否有效
-def verify_cookie(cookie):
+# 验证Cookie是否有效，返回 (状态, 用户名或错误信息)
+# 状态为 None 表示网络错误、限流或熔断等临时失败，无法判断 cookie 是否失效
+async def verify_cookie(cookie, account=None):
+    client = get_client(cookie, account)
     try:
-        client = P115Client(cookie)
-        # 尝试获取用户信息或执行简单操作来验证cookie
-        info = client.get_user_info()
-        return True, info.get('data', {}).get('user_name', '未知用户')
+        info = await guarded_call(account, lambda: client.get_user_info(async_=True), call='get_user_info')
     except Exception as e:
+        if isinstance(e, CircuitOpenError) or is_transient_error(e):
+            return None, str(e)
         return False, str(e)
+    if info.get('state', False):
+        return True, info.get('data', {}).get('user_name', '未知用户')
+    error_msg = info.get('error') or info.get('error_msg') or '未知错误'
+    if is_transient_response(info):
+        return None, error_msg
+    return False, error_msg
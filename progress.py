@@ -0,0 +1,96 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 默认的进度消息最短编辑间隔（秒），Telegram 对同一聊天的编辑频率有限制
+DEFAULT_INTERVAL = 3.0
+
+# 链接类型的显示名称
+PROGRESS_LABELS = {
+    "share": "115分享链接",
+    "offline": "离线下载链接",
+}
+
+# 处理进度：按链接类型统计已完成、失败、跳过和总数
+class ProgressTracker:
+    def __init__(self, totals, listener=None):
+        self.stats = {
+            kind: {"done": 0, "failed": 0, "skipped": 0, "total": total}
+            for kind, total in totals.items()
+        }
+        self.listener = listener
+
+    def _notify(self):
+        if self.listener is not None:
+            self.listener(self.snapshot())
+
+    # 记录一个链接的处理结果
+    def record(self, kind, ok, count=1):
+        self.stats[kind]["done" if ok else "failed"] += count
+        self._notify()
+
+    # 记录被跳过的链接
+    def skip(self, kind, count):
+        if count:
+            self.stats[kind]["skipped"] += count
+            self._notify()
+
+    def snapshot(self):
+        return {kind: dict(stat) for kind, stat in self.stats.items()}
+
+# 生成进度消息文本
+def format_progress(snapshot):
+    lines = ["正在处理链接，请稍候..."]
+    for kind, stat in snapshot.items():
+        if not stat["total"]:
+            continue
+        finished = stat["done"] + stat["failed"] + stat["skipped"]
+        remaining = max(0, stat["total"] - finished)
+        lines.append(
+            f"【{PROGRESS_LABELS.get(kind, kind)}】完成 {stat['done']}/{stat['total']}，"
+            f"失败 {stat['failed']}，跳过 {stat['skipped']}，剩余 {remaining}"
+        )
+    return "\n".join(lines)
+
+# 节流的进度消息：只保留最新进度，按固定间隔编辑消息，不阻塞处理流程
+class ProgressReporter:
+    def __init__(self, bot, chat_id, message_id, interval=DEFAULT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self._latest = None
+        self._last_text = None
+        self._changed = asyncio.Event()
+        self._task = None
+
+    # 进度回调，只记录最新进度并唤醒编辑协程
+    def __call__(self, snapshot):
+        self._latest = snapshot
+        self._changed.set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            # 先等待一个间隔，处理很快的批次不会产生额外的编辑
+            await asyncio.sleep(self.interval)
+            await self._changed.wait()
+            self._changed.clear()
+
+            text = format_progress(self._latest)
+            if text == self._last_text:
+                continue
+            try:
+                await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+                self._last_text = text
+            except Exception as e:
+                logger.warning("更新进度消息失败: %s", e)
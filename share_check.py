@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from api_guard import guarded_call, is_login_error, is_transient_response
+from config_utils import get_config
+
+# 分享元数据缓存的默认有效期（秒）
+DEFAULT_TTL = 600
+
+# 缓存条目上限
+MAX_ENTRIES = 10000
+
+# 分享状态缓存：{(share_code, receive_code): (是否有效, 原因, 过期时间)}，按 LRU 淘汰
+class ShareMetaCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, share_code, receive_code):
+        key = (share_code, receive_code)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0], entry[1]
+
+    def set(self, share_code, receive_code, alive, reason=None, ttl=None):
+        key = (share_code, receive_code)
+        self._entries[key] = (alive, reason, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+_cache = ShareMetaCache()
+
+# 获取进程内共享的分享状态缓存
+def get_share_cache():
+    return _cache
+
+# 查询分享快照判断分享是否有效，返回 (是否有效, 原因)；无法判断时返回 (None, 原因)
+# pacer 为账号的节奏控制器，预检请求与转存共用同一节奏，不会额外触发限流
+async def check_share(client, share_code, receive_code, account=None, pacer=None):
+    cached = _cache.get(share_code, receive_code)
+    if cached is not None:
+        return cached
+
+    payload = {'share_code': share_code, 'receive_code': receive_code, 'offset': 0, 'limit': 1}
+    try:
+        res = await guarded_call(
+            account, lambda: client.share_snap(payload, async_=True), call='share_snap', pacer=pacer
+        )
+    except Exception as e:
+        return None, str(e)
+
+    ttl = get_config().get('share_cache_ttl', DEFAULT_TTL)
+    if res.get('state', False):
+        _cache.set(share_code, receive_code, True, ttl=ttl)
+        return True, None
+    reason = res.get('error') or res.get('error_msg') or '分享已失效'
+    # 临时错误和登录失效与分享本身无关，不缓存，以免更新 cookie 或换账号后仍被当作失效分享跳过
+    if is_transient_response(res) or is_login_error(res):
+        return None, reason
+    _cache.set(share_code, receive_code, False, reason, ttl)
+    return False, reason
+
+# 并发预检分享链接，items 为 [(link, share_code, receive_code), ...]
+# 返回 (需要提交的链接, 已失效的链接 [(item, 原因)])，无法判断的链接照常提交
+async def prevalidate_shares(client, items, account=None, concurrency=4, pacer=None):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check_one(item):
+        async with semaphore:
+            return await check_share(client, item[1], item[2], account, pacer)
+
+    outcomes = await asyncio.gather(*(check_one(item) for item in items))
+    alive, dead = [], []
+    for item, (ok, reason) in zip(items, outcomes):
+        if ok is False:
+            dead.append((item, reason))
+        else:
+            alive.append(item)
+    return alive, dead
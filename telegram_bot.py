@@ -1,15 +1,37 @@
 import asyncio
+import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
 
-from config_utils import load_config, save_config, is_user_bound, has_permission
-from p115_transfer import extract_share_info, batch_transfer, find_valid_links
-from link_processor import process_mixed_links
+from config_utils import load_config, get_config, save_config, is_user_bound, has_permission
+from document_ingest import MAX_DOCUMENT_SIZE, DocumentSource, document_source, ingest_document, is_link_document
+from link_parser import has_links
+from p115_transfer import batch_transfer
+from job_queue import get_job_queue, DEFAULT_WORKERS
+from account_pool import POOL_TARGET, pool_targets
+from callback_tokens import make_callback, resolve_callback
+from cookie_health import get_cookie_monitor
+from link_processor import process_mixed_links, process_pool_links
+from metrics import track_handler
+from offline_poller import get_offline_poller
+from progress import ProgressReporter, DEFAULT_INTERVAL as DEFAULT_PROGRESS_INTERVAL
+from tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+# 每个用户最多同时等待选择账号或目录的消息数
+MAX_PENDING = 20
+
+# 文档各部分状态消息之间的最短间隔（秒），避免连续发送触发 Telegram 同一聊天的频率限制
+DOCUMENT_MESSAGE_INTERVAL = 1.0
+
+# 发送消息触发频率限制时的最多尝试次数
+SEND_ATTEMPTS = 3
 
 # 异步转存分享链接
-async def async_transfer(cookie, content, share_cid):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, batch_transfer, cookie, content, share_cid)
+async def async_transfer(cookie, content, share_cid, account=None, force=False):
+    return await batch_transfer(cookie, content, share_cid, account, force)
 
 # 处理/start命令
 async def start(update: Update, context: CallbackContext):
@@ -101,17 +123,40 @@ async def unbind(update: Update, context: CallbackContext):
     await asyncio.sleep(1)
     await update.message.delete()
 
+# 下一次提交忽略已转存记录，强制重新提交
+async def force(update: Update, context: CallbackContext):
+    user_id = update.message.from_user.id
+
+    # 检查权限
+    if not has_permission(user_id):
+        await update.message.reply_text("无权限操作")
+        return
+
+    if not is_user_bound(user_id):
+        await update.message.reply_text("请绑定用户 ID 才能使用此功能。")
+        return
+
+    context.user_data['force_next'] = True
+    await update.message.reply_text("下一次提交将忽略已转存记录，强制重新转存。")
+
+    await asyncio.sleep(1)
+    await update.message.delete()
+
 # 构建结果消息
 def build_result_message(results):
     result_message = "*处理结果汇总:*\n"
     
-    has_share = results["share"]["success"] > 0 or results["share"]["failure"] > 0
-    has_offline = results["offline"]["success"] > 0 or results["offline"]["failure"] > 0
+    has_share = results["share"]["success"] > 0 or results["share"]["failure"] > 0 or results["share"].get("skipped", 0) > 0
+    has_offline = results["offline"]["success"] > 0 or results["offline"]["failure"] > 0 or results["offline"].get("skipped", 0) > 0
     
     # 115分享链接结果
     if has_share:
         result_message += "\n*【115分享链接】*"
         result_message += f"\n转存成功: {results['share']['success']} 个"
+        if results["share"].get("rate"):
+            result_message += f"\n转存速度: {results['share']['rate']:.1f} 个/秒"
+        if results["share"].get("skipped"):
+            result_message += f"\n已转存过(跳过): {results['share']['skipped']} 个"
         if results["share"]["failure"] > 0:
             result_message += f"\n转存失败: {results['share']['failure']} 个"
             if results["share"]["reasons"]:
@@ -128,6 +173,8 @@ def build_result_message(results):
             result_message += "\n*【离线下载链接】*"
             
         result_message += f"\n添加成功: {results['offline']['success']} 个"
+        if results["offline"].get("skipped"):
+            result_message += f"\n已添加过(跳过): {results['offline']['skipped']} 个"
         if results["offline"]["failure"] > 0:
             result_message += f"\n添加失败: {results['offline']['failure']} 个"
             if results["offline"]["reasons"]:
@@ -135,13 +182,157 @@ def build_result_message(results):
                 if len(results["offline"]["reasons"]) > 5:
                     result_message += f"\n...等共 {len(results['offline']['reasons'])} 个失败原因"
     
+    # 账号池模式下各账号的处理情况
+    if len(results.get("accounts", {})) > 0:
+        result_message += "\n\n*【账号分布】*"
+        for account, account_results in results["accounts"].items():
+            share, offline = account_results["share"], account_results["offline"]
+            result_message += (
+                f"\n{account}: 转存 {share['success']}/{share['success'] + share['failure']}，"
+                f"离线 {offline['success']}/{offline['success'] + offline['failure']}"
+            )
+            skipped = share["skipped"] + offline["skipped"]
+            if skipped:
+                result_message += f"，跳过 {skipped}"
+
     # 如果没有任何内容，显示未找到链接的提示
     if not has_share and not has_offline:
         result_message += "\n未找到任何有效链接或处理过程中出现错误"
         
     return result_message
 
+# 将链接处理提交到持久化任务队列，处理结果会更新到 status_message
+def submit_link_job(status_message, account_name, folder_id, content, entities, context: CallbackContext):
+    force = context.user_data.pop('force_next', False)
+    get_job_queue().submit(
+        status_message.chat_id, status_message.message_id, account_name, folder_id, content, entities, force
+    )
+
+# 发送消息，触发 Telegram 频率限制（RetryAfter）时按要求的时间等待后重试
+async def send_with_retry(bot, chat_id, text):
+    for attempt in range(SEND_ATTEMPTS):
+        try:
+            return await bot.send_message(chat_id, text)
+        except RetryAfter as e:
+            if attempt == SEND_ATTEMPTS - 1:
+                raise
+            delay = e.retry_after
+            delay = delay.total_seconds() if hasattr(delay, 'total_seconds') else float(delay)
+            logger.info("发送消息触发频率限制，%.0f 秒后重试", delay)
+            await asyncio.sleep(delay)
+
+# 提交链接：文本直接加入任务队列；文档下载后逐行解析，按块拆分为多个任务，每块单独回复处理结果
+# 各部分的状态消息按 DOCUMENT_MESSAGE_INTERVAL 间隔发送
+async def submit_links(bot, status_message, account_name, folder_id, content, entities, context: CallbackContext):
+    if not isinstance(content, DocumentSource):
+        submit_link_job(status_message, account_name, folder_id, content, entities, context)
+        return
+
+    force = context.user_data.pop('force_next', False)
+    queue = get_job_queue()
+    chat_id = status_message.chat_id
+    loop = asyncio.get_running_loop()
+    submitted = 0
+    last_sent = loop.time()
+
+    async def submit_chunk(index, chunk):
+        nonlocal submitted, last_sent
+        text = f"正在处理 {content.file_name} 第 {index} 部分，请稍候..."
+        if index == 1:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=status_message.message_id)
+            message_id = status_message.message_id
+        else:
+            delay = last_sent + DOCUMENT_MESSAGE_INTERVAL - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            message_id = (await send_with_retry(bot, chat_id, text)).message_id
+            last_sent = loop.time()
+        queue.submit(chat_id, message_id, account_name, folder_id, chunk, None, force)
+        submitted = index
+
+    try:
+        count = await ingest_document(bot, content, submit_chunk)
+    except Exception as e:
+        logger.warning("处理文档 %s 失败（已提交 %d 部分）: %s", content.file_name, submitted, e)
+        if not submitted:
+            await bot.edit_message_text(f"读取文件失败: {e}", chat_id=chat_id, message_id=status_message.message_id)
+            return
+        # 已提交的部分照常处理，另发一条消息说明其余部分没有提交，不覆盖第 1 部分的结果
+        try:
+            await send_with_retry(bot, chat_id, f"{content.file_name} 已提交前 {submitted} 部分，其余部分未能提交: {e}")
+        except Exception as notify_error:
+            logger.warning("发送文档提交失败通知失败: %s", notify_error)
+        return
+    if count == 0:
+        await bot.edit_message_text("文件中未找到任何有效链接", chat_id=chat_id, message_id=status_message.message_id)
+
+# 保存等待选择账号或目录的消息，以原消息 ID 区分，返回写入按钮回调数据的 ID
+def store_pending(context: CallbackContext, message, content, entities):
+    pending = context.user_data.setdefault('pending', {})
+    pending_id = str(message.message_id)
+    pending[pending_id] = (content, entities)
+    # 只保留最近的若干条，丢弃最早的
+    while len(pending) > MAX_PENDING:
+        pending.pop(next(iter(pending)))
+    return pending_id
+
+# 取出等待中的消息，返回 (内容, 实体)，不存在时返回 (None, None)
+def pop_pending(context: CallbackContext, pending_id):
+    return context.user_data.get('pending', {}).pop(pending_id, (None, None))
+
+# 执行队列中的链接处理任务，处理过程中节流更新进度，返回结果消息
+async def run_link_job(bot, job):
+    config = get_config()
+    if job["account"] == POOL_TARGET:
+        targets = pool_targets(config)
+        if not targets:
+            return "处理失败：账号池中没有可用的账号和目录"
+    else:
+        account_data = config["cookies"].get(job["account"])
+        if account_data is None:
+            return f"处理失败：账号 {job['account']} 不存在"
+
+    reporter = ProgressReporter(
+        bot, job["chat_id"], job["message_id"], float(config.get('progress_interval', DEFAULT_PROGRESS_INTERVAL))
+    )
+    reporter.start()
+    try:
+        if job["account"] == POOL_TARGET:
+            results = await process_pool_links(targets, job["content"], job["entities"], job["force"], reporter)
+        else:
+            results = await process_mixed_links(
+                account_data["cookie"], job["content"], job["folder_id"], job["entities"], job["account"], job["force"],
+                reporter
+            )
+    finally:
+        await reporter.stop()
+
+    # 跟踪提交成功的离线任务，完成或失败时通知用户
+    poller = get_offline_poller()
+    if job["account"] == POOL_TARGET:
+        for account, account_results in results.get("accounts", {}).items():
+            poller.track(account, job["chat_id"], account_results["offline"]["submitted"])
+    else:
+        poller.track(job["account"], job["chat_id"], results["offline"]["submitted"])
+    with span('build_result_message'):
+        return build_result_message(results)
+
+# 启动任务队列的工作协程、离线任务轮询和 Cookie 检查
+async def start_workers(application: Application):
+    workers = get_config().get('job_workers', DEFAULT_WORKERS)
+    await get_job_queue().start(application.bot, run_link_job, workers)
+    await get_offline_poller().start(application.bot)
+    await get_cookie_monitor().start(application.bot)
+
+# 停止任务队列的工作协程、离线任务轮询和 Cookie 检查
+async def stop_workers(application: Application):
+    await get_job_queue().stop()
+    await get_offline_poller().stop()
+    await get_cookie_monitor().stop()
+
 # 处理用户发来的消息
+@track_handler('handle_message')
+@traced('handle_message')
 async def handle_message(update: Update, context: CallbackContext):
     user_id = update.message.from_user.id
 
@@ -159,52 +350,60 @@ async def handle_message(update: Update, context: CallbackContext):
     user_message = message.text if message.text else message.caption or ""
     entities = message.entities if message.text else message.caption_entities or []
 
-    # 检查消息是否包含任何我们支持的链接类型或实体
-    if ("115.com" in user_message or "115cdn.com" in user_message or "anxia.com" in user_message or
-        "http://" in user_message or "https://" in user_message or "ftp://" in user_message or 
-        "magnet:" in user_message or "ed2k://" in user_message or
-        any(entity.type == 'text_link' for entity in entities)):
+    # 链接列表文本文件：先记录 file_id，提交时再下载解析
+    document = message.document
+    if document is not None and is_link_document(document):
+        if document.file_size and document.file_size > MAX_DOCUMENT_SIZE:
+            await update.message.reply_text(f"文件过大，最大支持 {MAX_DOCUMENT_SIZE // (1024 * 1024)} MB")
+            return
+        user_message = document_source(document)
+        entities = []
+        found = True
+    else:
+        # 检查消息是否包含任何我们支持的链接类型或实体
+        with span('has_links'):
+            found = has_links(user_message, entities)
+    if found:
         
-        config = load_config()
+        config = get_config()
         cookies = config["cookies"]
         
         if len(cookies) == 1:
             # 只有一个账号的情况
             account_name, account_data = list(cookies.items())[0]
-            cookie = account_data["cookie"]
             cid_map = account_data["cid"]
 
-            if len(cid_map) == 1:
+            if get_cookie_monitor().is_expired(account_name, account_data["cookie"]):
+                await update.message.reply_text(f"账号 {account_name} 的 Cookie 已失效，请使用 /115set 更新后重新发送链接。")
+            elif len(cid_map) == 1:
                 # 只有一个 CID，直接使用
                 folder_id = list(cid_map.values())[0]
                 
-                # 使用新的混合处理函数，传递实体
-                results = await process_mixed_links(cookie, user_message, folder_id, entities)
-                
-                # 构建结果消息
-                result_message = build_result_message(results)
-                
-                await update.message.reply_text(result_message, parse_mode='Markdown')
+                # 加入任务队列，处理完成后更新这条回复
+                with span('reply'):
+                    status_message = await update.message.reply_text("正在处理链接，请稍候...")
+                with span('submit_job'):
+                    await submit_links(context.bot, status_message, account_name, folder_id, user_message, entities, context)
             else:
-                # 多个 CID，需要选择
+                # 多个 CID，需要选择；保存消息和实体信息，按钮中带上消息 ID
+                pending_id = store_pending(context, message, user_message, entities)
                 keyboard = [
-                    [InlineKeyboardButton(text=folder_name, callback_data=f"mixed_{account_name}|{cid}")]
+                    [InlineKeyboardButton(text=folder_name, callback_data=make_callback("mixed_", account=account_name, target=cid, pending=pending_id))]
                     for folder_name, cid in cid_map.items()
                 ]
                 reply_markup = InlineKeyboardMarkup(keyboard)
-                # 保存消息和实体信息
-                context.user_data['user_message'] = user_message
-                context.user_data['message_entities'] = entities
                 await update.message.reply_text("请选择要保存内容的文件夹：", reply_markup=reply_markup)
         else:
-            # 多个账号的情况
+            # 多个账号的情况，Cookie 已失效的账号会标出
+            pending_id = store_pending(context, message, user_message, entities)
+            monitor = get_cookie_monitor()
             keyboard = [
-                [InlineKeyboardButton(text=account_name, callback_data=f"mixed_{account_name}|select")]
-                for account_name in cookies.keys()
+                [InlineKeyboardButton(text=monitor.label(account_name, account_data["cookie"]), callback_data=make_callback("mixed_", account=account_name, target="select", pending=pending_id))]
+                for account_name, account_data in cookies.items()
             ]
+            # 账号池：把链接分散到所有账号处理
+            keyboard.append([InlineKeyboardButton(text="账号池（分散到所有账号）", callback_data=make_callback("mixed_", account=POOL_TARGET, target="pool", pending=pending_id))])
             reply_markup = InlineKeyboardMarkup(keyboard)
-            context.user_data['user_message'] = user_message
-            context.user_data['message_entities'] = entities
             await update.message.reply_text("请选择要使用的账号：", reply_markup=reply_markup)
         return
 
@@ -296,6 +495,7 @@ async def handle_message(update: Update, context: CallbackContext):
                 # 添加文件夹和CID
                 config_data['cookies'][account]['cid'][folder] = cid
                 save_config(config_data)
+                get_cookie_monitor().check_soon()
 
                 # 清除缓存数据
                 del context.user_data['action']
@@ -348,6 +548,7 @@ async def handle_message(update: Update, context: CallbackContext):
                     del config_data['cookies'][account_name]
 
                 save_config(config_data)
+                get_cookie_monitor().check_soon()
 
                 message = await update.message.reply_text(f"更改成功！")
                 context.user_data['message_ids'].append(message.message_id)
@@ -461,7 +662,15 @@ async def handle_message(update: Update, context: CallbackContext):
             message = await update.message.reply_text("请先选择一个操作。")
             context.user_data['message_ids'].append(message.message_id)
 
+# 选中的账号 Cookie 已失效时提示用户更新或选择其他账号，按钮保留；返回是否已拒绝
+async def reject_expired_account(query, account_name, account_data):
+    if not get_cookie_monitor().is_expired(account_name, account_data["cookie"]):
+        return False
+    await query.answer(f"账号 {account_name} 的 Cookie 已失效，请使用 /115set 更新或选择其他账号", show_alert=True)
+    return True
+
 # 处理转存按钮点击事件
+@traced('handle_transfer')
 async def handle_transfer(update: Update, context: CallbackContext):
     user_id = update.callback_query.from_user.id
 
@@ -475,12 +684,19 @@ async def handle_transfer(update: Update, context: CallbackContext):
         return
 
     query = update.callback_query
-    data = query.data
-    config = load_config()
+    action = resolve_callback(query.data, "transfer_")
+    if action is None:
+        await query.edit_message_text("按钮已过期，请重新发送链接。")
+        await query.answer()
+        return
+    account_name, target, pending_id = action["account"], action["target"], action["pending"]
+
+    config = get_config()
     cookies = config["cookies"]
+    if account_name in cookies and await reject_expired_account(query, account_name, cookies[account_name]):
+        return
 
-    if "|select" in data:
-        account_name = data.split("|")[0].replace("transfer_", "")
+    if target == "select":
         account_data = cookies[account_name]
         cid_map = account_data["cid"]
 
@@ -489,12 +705,17 @@ async def handle_transfer(update: Update, context: CallbackContext):
             # 如果只有一个 CID，直接使用
             share_cid = list(cid_map.values())[0]
             cookie = account_data["cookie"]
-            user_message = context.user_data.get('user_message', '')
+            user_message, _ = pop_pending(context, pending_id)
 
             if user_message:
-                success_count, failure_count, failure_reasons = await async_transfer(cookie, user_message, share_cid)
+                success_count, failure_count, failure_reasons, rate, skipped = await async_transfer(
+                    cookie, user_message, share_cid, account_name, context.user_data.pop('force_next', False))
 
                 result_message = f"*转存结果:*\n\n转存成功 {success_count} 个链接"
+                if rate:
+                    result_message += f"\n转存速度: {rate:.1f} 个/秒"
+                if skipped:
+                    result_message += f"\n已转存过(跳过): {skipped} 个"
                 if failure_count > 0:
                     result_message += f"\n转存失败 {failure_count} 个链接"
                     if len(failure_reasons) > 0 and failure_reasons[0] != "未在消息中找到有效的115分享链接":
@@ -506,22 +727,27 @@ async def handle_transfer(update: Update, context: CallbackContext):
         else:
             # 多个 CID，需要选择
             keyboard = [
-                [InlineKeyboardButton(text=folder_name, callback_data=f"transfer_{account_name}|{cid}")]
+                [InlineKeyboardButton(text=folder_name, callback_data=make_callback("transfer_", account=account_name, target=cid, pending=pending_id))]
                 for folder_name, cid in cid_map.items()
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("请选择要转存的文件夹：", reply_markup=reply_markup)
     else:
-        account_name, share_cid = data.replace("transfer_", "").split("|")
+        share_cid = target
         account_data = cookies[account_name]
         cookie = account_data["cookie"]
 
-        user_message = context.user_data.get('user_message', '')
+        user_message, _ = pop_pending(context, pending_id)
 
         if user_message:
-            success_count, failure_count, failure_reasons = await async_transfer(cookie, user_message, share_cid)
+            success_count, failure_count, failure_reasons, rate, skipped = await async_transfer(
+                cookie, user_message, share_cid, account_name, context.user_data.pop('force_next', False))
 
             result_message = f"*转存结果:*\n\n转存成功 {success_count} 个链接"
+            if rate:
+                result_message += f"\n转存速度: {rate:.1f} 个/秒"
+            if skipped:
+                result_message += f"\n已转存过(跳过): {skipped} 个"
             if failure_count > 0:
                 result_message += f"\n转存失败 {failure_count} 个链接"
                 if len(failure_reasons) > 0 and failure_reasons[0] != "未在消息中找到有效的115分享链接":
@@ -538,6 +764,8 @@ async def handle_offline(update: Update, context: CallbackContext):
     await handle_mixed(update, context)
 
 # 处理混合链接按钮点击事件
+@track_handler('handle_mixed')
+@traced('handle_mixed')
 async def handle_mixed(update: Update, context: CallbackContext):
     user_id = update.callback_query.from_user.id
 
@@ -552,16 +780,22 @@ async def handle_mixed(update: Update, context: CallbackContext):
 
     query = update.callback_query
     data = query.data
-    pattern = r'^mixed_|^offline_'  # 同时支持mixed_和offline_前缀
     
-    # 检测前缀并统一处理
+    # 检测前缀并统一处理（同时支持mixed_和offline_前缀）
     prefix = "mixed_" if data.startswith("mixed_") else "offline_"
+    action = resolve_callback(data, prefix)
+    if action is None:
+        await query.edit_message_text("按钮已过期，请重新发送链接。")
+        await query.answer()
+        return
+    account_name, target, pending_id = action["account"], action["target"], action["pending"]
     
-    config = load_config()
+    config = get_config()
     cookies = config["cookies"]
+    if account_name in cookies and await reject_expired_account(query, account_name, cookies[account_name]):
+        return
 
-    if "|select" in data:
-        account_name = data.split("|")[0].replace(prefix, "")
+    if target == "select":
         account_data = cookies[account_name]
         cid_map = account_data["cid"]
 
@@ -569,65 +803,49 @@ async def handle_mixed(update: Update, context: CallbackContext):
         if len(cid_map) == 1:
             # 如果只有一个 CID，直接使用
             folder_id = list(cid_map.values())[0]
-            cookie = account_data["cookie"]
-            user_message = context.user_data.get('user_message', '')
-            entities = context.user_data.get('message_entities', [])
+            user_message, entities = pop_pending(context, pending_id)
 
             if user_message:
                 await query.edit_message_text("正在处理链接，请稍候...")
-                
-                # 使用混合处理函数，传递实体
-                results = await process_mixed_links(cookie, user_message, folder_id, entities)
-                
-                # 构建结果消息
-                result_message = build_result_message(results)
-                
-                await query.edit_message_text(result_message, parse_mode='Markdown')
+                await submit_links(context.bot, query.message, account_name, folder_id, user_message, entities, context)
             else:
-                await query.edit_message_text("未找到有效的链接，操作失败！")
+                await query.edit_message_text("未找到待处理的消息（可能已处理或已过期），请重新发送链接。")
         else:
             # 多个 CID，需要选择
             keyboard = [
-                [InlineKeyboardButton(text=folder_name, callback_data=f"{prefix}{account_name}|{cid}")]
+                [InlineKeyboardButton(text=folder_name, callback_data=make_callback(prefix, account=account_name, target=cid, pending=pending_id))]
                 for folder_name, cid in cid_map.items()
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await query.edit_message_text("请选择要保存内容的文件夹：", reply_markup=reply_markup)
     else:
-        account_name, folder_id = data.replace(prefix, "").split("|")
-        account_data = cookies[account_name]
-        cookie = account_data["cookie"]
-
-        user_message = context.user_data.get('user_message', '')
-        entities = context.user_data.get('message_entities', [])
+        folder_id = target
+        user_message, entities = pop_pending(context, pending_id)
 
         if user_message:
             await query.edit_message_text("正在处理链接，请稍候...")
-            
-            # 使用混合处理函数，传递实体
-            results = await process_mixed_links(cookie, user_message, folder_id, entities)
-            
-            # 构建结果消息
-            result_message = build_result_message(results)
-            
-            await query.edit_message_text(result_message, parse_mode='Markdown')
+            await submit_links(context.bot, query.message, account_name, folder_id, user_message, entities, context)
         else:
-            await query.edit_message_text("未找到有效的链接，操作失败！")
+            await query.edit_message_text("未找到待处理的消息（可能已处理或已过期），请重新发送链接。")
     await query.answer()
 
 # 创建账号列表菜单
 def create_account_keyboard(cookies):
     keyboard = []
     row = []
-    for account in cookies.keys():
-        row.append(InlineKeyboardButton(account, callback_data=f'settings_account_{account}'))
+    monitor = get_cookie_monitor()
+    for account, data in cookies.items():
+        row.append(InlineKeyboardButton(monitor.label(account, data.get('cookie')), callback_data=make_callback('settings_', op='account', account=account)))
         if len(row) == 2:
             keyboard.append(row)
             row = []
     if row:
         keyboard.append(row)
 
-    keyboard.append([InlineKeyboardButton("添加", callback_data='settings_add_cookie'), InlineKeyboardButton("退出", callback_data='settings_exit')])
+    keyboard.append([
+        InlineKeyboardButton("添加", callback_data=make_callback('settings_', op='add_cookie')),
+        InlineKeyboardButton("退出", callback_data=make_callback('settings_', op='exit'))
+    ])
     return InlineKeyboardMarkup(keyboard)
 
 # 设置命令菜单
@@ -640,7 +858,8 @@ async def set_commands(application: Application):
         ('start', '开始'),
         ('115set', '115设置'),
         ('bind', '绑定'),
-        ('unbind', '解绑')
+        ('unbind', '解绑'),
+        ('force', '强制重新转存')
     ]
     await application.bot.set_my_commands(commands)
 
@@ -658,13 +877,15 @@ async def set_115(update: Update, context: CallbackContext) -> None:
         await asyncio.sleep(1)
         await update.message.delete()
     else:
-        config_data = load_config()
+        config_data = get_config()
         reply_markup = create_account_keyboard(config_data.get('cookies', {}))
         context.user_data['message_ids'] = [update.message.message_id]
         message = await update.message.reply_text('选择账号管理:', reply_markup=reply_markup)
         context.user_data['message_ids'].append(message.message_id) 
 
 # 处理交互式菜单
+@track_handler('handle_interaction')
+@traced('handle_interaction')
 async def handle_interaction(update: Update, context: CallbackContext) -> None:
     user_id = update.callback_query.from_user.id
 
@@ -680,46 +901,54 @@ async def handle_interaction(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
     await query.answer()
 
-    data = query.data
+    action = resolve_callback(query.data, 'settings_')
+    if action is None:
+        await query.edit_message_text("菜单已过期，请重新发送 /115set。")
+        return
+    op = action['op']
+    account_name = action.get('account')
+    cid_name = action.get('cid')
     
     # 确保message_ids列表存在
     if 'message_ids' not in context.user_data:
         context.user_data['message_ids'] = []
 
     # 处理 /115set 的交互
-    if data.startswith('settings_account_'):
-        account_name = data.split('settings_account_', 1)[1]
+    if op == 'account':
         context.user_data['selected_account'] = account_name
 
-        config_data = load_config()
+        config_data = get_config()
         if account_name in config_data['cookies']:
             account_info = config_data['cookies'][account_name]
 
             keyboard = [
                 [
-                    InlineKeyboardButton("更改", callback_data=f'settings_change_cookie_{account_name}'),
-                    InlineKeyboardButton("删除", callback_data=f'settings_delete_cookie_{account_name}'),
-                    InlineKeyboardButton("CID", callback_data=f'settings_manage_cid_{account_name}')
+                    InlineKeyboardButton("更改", callback_data=make_callback('settings_', op='change_cookie', account=account_name)),
+                    InlineKeyboardButton("删除", callback_data=make_callback('settings_', op='delete_cookie', account=account_name)),
+                    InlineKeyboardButton("CID", callback_data=make_callback('settings_', op='manage_cid', account=account_name))
                 ],
-                [InlineKeyboardButton("返回", callback_data='settings_back_to_accounts'), InlineKeyboardButton("退出", callback_data='settings_exit')]
+                [
+                    InlineKeyboardButton("返回", callback_data=make_callback('settings_', op='back_to_accounts')),
+                    InlineKeyboardButton("退出", callback_data=make_callback('settings_', op='exit'))
+                ]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
-            message = await query.edit_message_text(f"账号名: {account_name}\nCookie: {account_info.get('cookie')}", reply_markup=reply_markup)
+            status = get_cookie_monitor().status_text(account_name, account_info.get('cookie'))
+            message = await query.edit_message_text(f"账号名: {account_name}\nCookie: {account_info.get('cookie')}\n状态: {status}", reply_markup=reply_markup)
             context.user_data['message_ids'].append(message.message_id)
         else:
             message = await query.edit_message_text(f"错误：未找到账号 {account_name} 的配置。")
             context.user_data['message_ids'].append(message.message_id)
 
-    elif data == 'settings_add_cookie':
+    elif op == 'add_cookie':
         message = await query.edit_message_text(text="请发送账号名：")
         context.user_data['message_ids'].append(message.message_id)
         context.user_data['action'] = 'add_cookie'
 
-    elif data.startswith('settings_manage_cid_'):
-        account_name = data.split('settings_manage_cid_', 1)[1]
+    elif op == 'manage_cid':
         context.user_data['selected_account'] = account_name
 
-        config_data = load_config()
+        config_data = get_config()
         if account_name in config_data['cookies']:
             cid_data = config_data['cookies'][account_name].get('cid', {})
 
@@ -727,15 +956,18 @@ async def handle_interaction(update: Update, context: CallbackContext) -> None:
             keyboard = []
             row = []
             for cid_name in cid_data.keys():
-                row.append(InlineKeyboardButton(cid_name, callback_data=f'settings_cid_{account_name}_{cid_name}'))
+                row.append(InlineKeyboardButton(cid_name, callback_data=make_callback('settings_', op='cid', account=account_name, cid=cid_name)))
                 if len(row) == 2:
                     keyboard.append(row)
                     row = []
             if row:
                 keyboard.append(row)
 
-            keyboard.append([InlineKeyboardButton("添加", callback_data=f'settings_add_cid_{account_name}')])
-            keyboard.append([InlineKeyboardButton("返回", callback_data=f'settings_account_{account_name}'), InlineKeyboardButton("退出", callback_data='settings_exit')])
+            keyboard.append([InlineKeyboardButton("添加", callback_data=make_callback('settings_', op='add_cid', account=account_name))])
+            keyboard.append([
+                InlineKeyboardButton("返回", callback_data=make_callback('settings_', op='account', account=account_name)),
+                InlineKeyboardButton("退出", callback_data=make_callback('settings_', op='exit'))
+            ])
 
             reply_markup = InlineKeyboardMarkup(keyboard)
             message = await query.edit_message_text(f"账号名: {account_name} 的CID:", reply_markup=reply_markup)
@@ -744,82 +976,62 @@ async def handle_interaction(update: Update, context: CallbackContext) -> None:
             message = await query.edit_message_text(f"错误：未找到账号 {account_name} 的配置。")
             context.user_data['message_ids'].append(message.message_id)
 
-    elif data.startswith('settings_cid_'):
-        parts = data.split('_', 3)
-        if len(parts) == 4:
-            _, _, account_name, cid_name = parts
-            context.user_data['selected_account'] = account_name
-            context.user_data['selected_cid'] = cid_name
+    elif op == 'cid':
+        context.user_data['selected_account'] = account_name
+        context.user_data['selected_cid'] = cid_name
 
-            config_data = load_config()
-            if account_name in config_data['cookies']:
-                cid_value = config_data['cookies'][account_name]['cid'].get(cid_name, '未设置')
+        config_data = get_config()
+        if account_name in config_data['cookies']:
+            cid_value = config_data['cookies'][account_name]['cid'].get(cid_name, '未设置')
 
-                keyboard = [
-                    [InlineKeyboardButton("更改", callback_data=f'settings_change_cid_{account_name}_{cid_name}'),
-                     InlineKeyboardButton("删除", callback_data=f'settings_delete_cid_{account_name}_{cid_name}')],
-                    [InlineKeyboardButton("返回", callback_data=f'settings_manage_cid_{account_name}'),
-                     InlineKeyboardButton("退出", callback_data='settings_exit')]
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                message = await query.edit_message_text(f"名称: {cid_name}\nCID: {cid_value}", reply_markup=reply_markup)
-                context.user_data['message_ids'].append(message.message_id)
-            else:
-                message = await query.edit_message_text(f"错误：未找到CID {cid_name} 的配置。")
-                context.user_data['message_ids'].append(message.message_id)
-        else:
-            await query.edit_message_text("无效的 CID 数据格式。")
-
-    elif data.startswith('settings_change_cid_'):
-        parts = data.split('_', 4)
-        if len(parts) >= 4:
-            account_name = parts[3]
-            cid_name = parts[4] if len(parts) > 4 else ""
-            context.user_data['selected_account'] = account_name
-            context.user_data['selected_cid'] = cid_name
-            message = await query.edit_message_text(f"请发送 {cid_name} 的新CID名称：")
+            keyboard = [
+                [InlineKeyboardButton("更改", callback_data=make_callback('settings_', op='change_cid', account=account_name, cid=cid_name)),
+                 InlineKeyboardButton("删除", callback_data=make_callback('settings_', op='delete_cid', account=account_name, cid=cid_name))],
+                [InlineKeyboardButton("返回", callback_data=make_callback('settings_', op='manage_cid', account=account_name)),
+                 InlineKeyboardButton("退出", callback_data=make_callback('settings_', op='exit'))]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            message = await query.edit_message_text(f"名称: {cid_name}\nCID: {cid_value}", reply_markup=reply_markup)
             context.user_data['message_ids'].append(message.message_id)
-            context.user_data['action'] = 'change_cid_name'
         else:
-            await query.edit_message_text("无效的请求，缺少账号或CID信息。")
-
-    elif data.startswith('settings_delete_cid_'):
-        parts = data.split('_', 4)
-        if len(parts) >= 4:
-            account_name = parts[3]
-            cid_name = parts[4] if len(parts) > 4 else ""
-            context.user_data['selected_account'] = account_name
-            context.user_data['selected_cid'] = cid_name
-
-            config_data = load_config()
-            if account_name in config_data['cookies'] and cid_name in config_data['cookies'][account_name]['cid']:
-                del config_data['cookies'][account_name]['cid'][cid_name]
-                save_config(config_data)
-                message = await query.edit_message_text(f"CID {cid_name} 已删除。")
-                context.user_data['message_ids'].append(message.message_id)
-                await delete_all_messages(context, query.message.chat_id)
-            else:
-                message = await query.edit_message_text(f"错误：未找到CID {cid_name} 的配置。")
-                context.user_data['message_ids'].append(message.message_id)
+            message = await query.edit_message_text(f"错误：未找到CID {cid_name} 的配置。")
+            context.user_data['message_ids'].append(message.message_id)
+
+    elif op == 'change_cid':
+        context.user_data['selected_account'] = account_name
+        context.user_data['selected_cid'] = cid_name
+        message = await query.edit_message_text(f"请发送 {cid_name} 的新CID名称：")
+        context.user_data['message_ids'].append(message.message_id)
+        context.user_data['action'] = 'change_cid_name'
+
+    elif op == 'delete_cid':
+        context.user_data['selected_account'] = account_name
+        context.user_data['selected_cid'] = cid_name
+
+        config_data = load_config()
+        if account_name in config_data['cookies'] and cid_name in config_data['cookies'][account_name]['cid']:
+            del config_data['cookies'][account_name]['cid'][cid_name]
+            save_config(config_data)
+            message = await query.edit_message_text(f"CID {cid_name} 已删除。")
+            context.user_data['message_ids'].append(message.message_id)
+            await delete_all_messages(context, query.message.chat_id)
         else:
-            await query.edit_message_text("无效的请求，缺少账号或CID信息。")
+            message = await query.edit_message_text(f"错误：未找到CID {cid_name} 的配置。")
+            context.user_data['message_ids'].append(message.message_id)
 
-    elif data.startswith('settings_add_cid_'):
-        account_name = data.split('settings_add_cid_', 1)[1]
+    elif op == 'add_cid':
         context.user_data['selected_account'] = account_name
         message = await query.edit_message_text(f"请发送CID的名称：")
         context.user_data['message_ids'].append(message.message_id)
         context.user_data['action'] = 'add_cid_name'
 
-    elif data.startswith('settings_change_cookie_'):
-        account_name = data.split('settings_change_cookie_', 1)[1]
+    elif op == 'change_cookie':
         context.user_data['selected_account'] = account_name
         message = await query.edit_message_text(f"请发送 {account_name} 的新账号名：")
         context.user_data['message_ids'].append(message.message_id)
         context.user_data['action'] = 'change_account_name'
 
-    elif data.startswith('settings_delete_cookie_'):
-        account_name = data.split('settings_delete_cookie_', 1)[1]
+    elif op == 'delete_cookie':
         context.user_data['selected_account'] = account_name
 
         config_data = load_config()
@@ -833,13 +1045,13 @@ async def handle_interaction(update: Update, context: CallbackContext) -> None:
             message = await query.edit_message_text(f"错误：未找到账号 {account_name} 的配置。")
             context.user_data['message_ids'].append(message.message_id)
 
-    elif data == 'settings_back_to_accounts':
-        config_data = load_config()
+    elif op == 'back_to_accounts':
+        config_data = get_config()
         reply_markup = create_account_keyboard(config_data.get('cookies', {}))
         message = await query.edit_message_text('选择账号管理:', reply_markup=reply_markup)
         context.user_data['message_ids'].append(message.message_id)
 
-    elif data == 'settings_exit':
+    elif op == 'exit':
         await query.delete_message()
         await delete_all_messages(context, query.message.chat_id)
     else:
@@ -847,4 +1059,5 @@ async def handle_interaction(update: Update, context: CallbackContext) -> None:
 
 # 错误处理
 async def handle_error(update: Update, context: CallbackContext):
-    print(f'错误: {update} 引发错误 {context.error}')
+    update_id = update.update_id if isinstance(update, Update) else None
+    logger.error("处理更新 %s 时出错", update_id, exc_info=context.error)
@@ -0,0 +1,173 @@
+import asyncio
+import time
+
+import pytest
+
+import api_guard
+from api_guard import CircuitBreaker, CircuitOpenError, RetryPolicy, guarded_call
+
+ACCOUNT = "账号"
+
+OK = {"state": True}
+BUSY = {"state": False, "error": "服务器繁忙"}
+THROTTLED = {"state": False, "error": "操作过于频繁，请稍后再试"}
+
+# 不等待退避，熔断时最多等待 1 秒
+POLICY = RetryPolicy(attempts=3, base_delay=0.0, rate_limit_attempts=6, circuit_wait=1.0)
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    monkeypatch.setattr(api_guard, "_breakers", {})
+    monkeypatch.setattr(api_guard, "PROBE_POLL_INTERVAL", 0.01)
+    return api_guard._breakers
+
+def install_breaker(threshold=2, cooldown=0.05):
+    breaker = api_guard._breakers[ACCOUNT] = CircuitBreaker(threshold=threshold, cooldown=cooldown)
+    return breaker
+
+def trip(breaker):
+    for _ in range(breaker.threshold):
+        breaker.on_failure()
+    assert breaker.state == "open"
+
+# 依次返回 responses 中的结果，记录调用次数
+class FakeCall:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.responses.pop(0)
+
+def test_breaker_trips_at_threshold():
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    breaker.on_failure()
+    breaker.on_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.on_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert 59 < breaker.retry_after() <= 60
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker(threshold=3, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    trips = api_guard.GUARD_STATS["trips"]
+    assert breaker.allow()
+    breaker.on_failure()
+    assert breaker.state == "open"
+    assert not breaker.probing
+    assert api_guard.GUARD_STATS["trips"] == trips + 1
+
+def test_probe_success_closes():
+    breaker = CircuitBreaker(threshold=1, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.on_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert breaker.allow() and breaker.allow()
+
+def test_rate_limit_does_not_trip():
+    breaker = install_breaker(threshold=1)
+    make_call = FakeCall(THROTTLED, THROTTLED, THROTTLED, OK)
+    assert asyncio.run(guarded_call(ACCOUNT, make_call, POLICY)) == OK
+    assert make_call.calls == 4
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_transient_failures_trip_and_wait_for_cooldown():
+    breaker = install_breaker(threshold=2, cooldown=0.1)
+    make_call = FakeCall(BUSY, BUSY, OK)
+
+    async def run():
+        started = time.monotonic()
+        res = await guarded_call(ACCOUNT, make_call, POLICY)
+        return res, time.monotonic() - started
+
+    res, elapsed = asyncio.run(run())
+    assert res == OK
+    assert elapsed >= 0.1
+    assert breaker.state == "closed"
+
+def test_rejects_after_circuit_wait():
+    breaker = install_breaker(threshold=1, cooldown=60)
+    trip(breaker)
+    make_call = FakeCall(OK)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(guarded_call(ACCOUNT, make_call, POLICY))
+    assert make_call.calls == 0
+
+def test_waiters_follow_probe_result():
+    breaker = install_breaker(threshold=1, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+
+    async def run():
+        gate = asyncio.Event()
+        calls = []
+
+        async def probe():
+            calls.append("probe")
+            await gate.wait()
+            return OK
+
+        async def follower():
+            calls.append("follower")
+            return OK
+
+        first = asyncio.create_task(guarded_call(ACCOUNT, probe, POLICY))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(guarded_call(ACCOUNT, follower, POLICY))
+        await asyncio.sleep(0.05)
+        # 试探请求未返回前，其他请求等待
+        assert calls == ["probe"]
+        gate.set()
+        await asyncio.gather(first, second)
+        return calls
+
+    assert asyncio.run(run()) == ["probe", "follower"]
+    assert breaker.state == "closed"
+
+def test_cancelled_probe_releases_slot():
+    breaker = install_breaker(threshold=1, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    async def run():
+        task = asyncio.create_task(guarded_call(ACCOUNT, hang, POLICY))
+        await asyncio.sleep(0.01)
+        assert breaker.probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not breaker.probing
+        return await guarded_call(ACCOUNT, FakeCall(OK), POLICY)
+
+    assert asyncio.run(run()) == OK
+    assert breaker.state == "closed"
+
+def test_throttled_probe_releases_slot():
+    breaker = install_breaker(threshold=1, cooldown=0.01)
+    trip(breaker)
+    time.sleep(0.02)
+    make_call = FakeCall(THROTTLED, OK)
+    assert asyncio.run(guarded_call(ACCOUNT, make_call, POLICY)) == OK
+    assert make_call.calls == 2
+    assert breaker.state == "closed"
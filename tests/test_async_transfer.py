@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("p115")
+
+import ledger
+import p115_transfer
+from config_utils import flush_config, save_config
+from link_processor import process_mixed_links
+from mock_115 import Mock115Backend
+
+COOKIE = "UID=1_test; CID=test"
+ACCOUNT = "账号"
+FOLDER = "3000000000000000000"
+
+# 长批次的分享链接数：并发 2、每次转存 0.2 秒，整批约 0.8 秒
+SHARES = 8
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ledger, "_ledger", ledger.Ledger(str(tmp_path / "ledger.db")))
+    save_config({
+        "tg_token": "0:test",
+        "bound_user_id": "1",
+        "share_precheck": False,
+        "share_concurrency": 2,
+        "cookies": {ACCOUNT: {"cookie": COOKIE, "cid": {"目录": FOLDER}}},
+    })
+    flush_config()
+
+    factory = p115_transfer._client_factory
+    backend = Mock115Backend(latency=0.2, jitter=0.0, seed=1)
+    p115_transfer.set_client_factory(backend.client)
+    yield backend
+    p115_transfer.set_client_factory(factory)
+
+def share_links(count):
+    return "\n".join(f"https://115.com/s/sw{i:08d}?password=ab{i:02d}" for i in range(count))
+
+# 长批次转存分享期间，同一账号的另一条消息（一个磁力链接）应先处理完成，而不是排在批次之后
+def test_other_update_finishes_while_batch_in_flight(backend):
+    async def main():
+        batch = asyncio.create_task(process_mixed_links(COOKIE, share_links(SHARES), FOLDER, account=ACCOUNT))
+        await asyncio.sleep(0.05)
+        other = asyncio.create_task(
+            process_mixed_links(COOKIE, "magnet:?xt=urn:btih:" + "a" * 40, FOLDER, account=ACCOUNT)
+        )
+        done, _ = await asyncio.wait({batch, other}, return_when=asyncio.FIRST_COMPLETED)
+        assert done == {other}
+        assert not batch.done()
+        return await batch, await other
+
+    batch_results, other_results = asyncio.run(main())
+    assert batch_results["share"]["success"] == SHARES
+    assert other_results["offline"]["success"] == 1
+    assert backend.calls["share_receive"] == SHARES
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import config_utils
+from config_utils import CONFIG_FILE, DEFAULT_CONFIG, flush_config, load_config, save_config
+
+CONFIG = {"tg_token": "0:test", "bound_user_id": "1", "cookies": {"账号": {"cookie": "UID=1", "cid": {}}}}
+
+@pytest.fixture(autouse=True)
+def config_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 测试中只通过 flush_config 落盘，避免后台定时器干扰
+    monkeypatch.setattr(config_utils, "SAVE_DELAY", 60)
+    flush_config()
+    monkeypatch.setitem(config_utils._config_cache, "data", None)
+    monkeypatch.setitem(config_utils._config_cache, "stat", None)
+    monkeypatch.setitem(config_utils._config_cache, "dirty", False)
+    yield tmp_path
+    flush_config()
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def test_save_writes_config_and_backup(config_dir):
+    save_config({**CONFIG, "bound_user_id": "2"})
+    save_config(CONFIG)
+    assert not (config_dir / CONFIG_FILE).exists()
+    assert load_config() == CONFIG
+
+    flush_config()
+    assert read_json(config_dir / CONFIG_FILE) == CONFIG
+    assert read_json(config_dir / (CONFIG_FILE + ".bak")) == CONFIG
+
+def test_corrupt_config_restored_from_backup(config_dir):
+    (config_dir / CONFIG_FILE).write_text('{"tg_token": "0:te', encoding="utf-8")
+    (config_dir / (CONFIG_FILE + ".bak")).write_text(json.dumps(CONFIG), encoding="utf-8")
+
+    assert load_config() == CONFIG
+    flush_config()
+    assert read_json(config_dir / CONFIG_FILE) == CONFIG
+
+def test_missing_config_restored_from_backup(config_dir):
+    (config_dir / (CONFIG_FILE + ".bak")).write_text(json.dumps(CONFIG), encoding="utf-8")
+
+    assert load_config() == CONFIG
+    flush_config()
+    assert read_json(config_dir / CONFIG_FILE) == CONFIG
+
+def test_corrupt_config_without_backup_is_kept(config_dir):
+    (config_dir / CONFIG_FILE).write_bytes(b"\xff\xfe not json")
+
+    assert load_config() == DEFAULT_CONFIG
+    assert (config_dir / (CONFIG_FILE + ".corrupt")).read_bytes() == b"\xff\xfe not json"
+    flush_config()
+    assert read_json(config_dir / CONFIG_FILE) == DEFAULT_CONFIG
+
+def test_load_config_returns_copy(config_dir):
+    save_config(CONFIG)
+    config = load_config()
+    config["cookies"].clear()
+    assert load_config() == CONFIG
@@ -0,0 +1,79 @@
+import hashlib
+import io
+import zipfile
+
+import pytest
+
+from torrent_parser import TorrentError, iter_torrent_magnets, make_magnet, parse_torrent
+
+TRACKER = "udp://tracker.example.com:80/announce"
+
+# 最小的 bencode 编码，键按字节序排序
+def bencode(value):
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(item) for item in value) + b"e"
+    items = sorted((key.encode("utf-8"), item) for key, item in value.items())
+    return b"d" + b"".join(bencode(key) + bencode(item) for key, item in items) + b"e"
+
+# pieces 超过缓冲区大小，覆盖流式跳过和跨缓冲区计算哈希
+def make_info(name, pieces=200 * 1024):
+    return {
+        "name": name,
+        "piece length": 262144,
+        "pieces": bytes(range(256)) * (pieces // 256),
+        "files": [{"length": 1024, "path": ["a", "b.mkv"]}],
+    }
+
+def make_torrent(name, pieces=200 * 1024):
+    info = make_info(name, pieces)
+    data = bencode({"announce": TRACKER, "comment": "test", "info": info})
+    return data, hashlib.sha1(bencode(info)).hexdigest()
+
+def test_info_hash_matches_sha1_of_bencoded_info():
+    data, expected = make_torrent("电影 2024")
+    assert parse_torrent(io.BytesIO(data)) == (expected, "电影 2024", TRACKER)
+
+def test_make_magnet_quotes_name_and_tracker():
+    assert make_magnet("abc", "a b", TRACKER) == (
+        "magnet:?xt=urn:btih:abc&dn=a%20b&tr=udp%3A%2F%2Ftracker.example.com%3A80%2Fannounce"
+    )
+    assert make_magnet("abc") == "magnet:?xt=urn:btih:abc"
+
+@pytest.mark.parametrize("cut", [1, 100, 50 * 1024, -1])
+def test_truncated_torrent(cut):
+    data, _ = make_torrent("x")
+    with pytest.raises(TorrentError):
+        parse_torrent(io.BytesIO(data[:cut]))
+
+def test_missing_info():
+    with pytest.raises(TorrentError):
+        parse_torrent(io.BytesIO(bencode({"announce": TRACKER})))
+
+def test_zip_dedups_and_skips_bad_members(tmp_path):
+    first, first_hash = make_torrent("first")
+    second, second_hash = make_torrent("second", pieces=1024)
+    path = tmp_path / "torrents.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a/first.torrent", first)
+        archive.writestr("b/copy.TORRENT", first)
+        archive.writestr("broken.torrent", first[:500])
+        archive.writestr("readme.txt", "not a torrent")
+        archive.writestr("second.torrent", second)
+
+    magnets = list(iter_torrent_magnets(str(path), "torrents.zip"))
+    assert magnets == [
+        make_magnet(first_hash, "first", TRACKER),
+        make_magnet(second_hash, "second", TRACKER),
+    ]
+
+def test_single_torrent_file(tmp_path):
+    data, info_hash = make_torrent("single")
+    path = tmp_path / "upload"
+    path.write_bytes(data)
+    assert list(iter_torrent_magnets(str(path), "single.torrent")) == [make_magnet(info_hash, "single", TRACKER)]
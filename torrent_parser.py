@@ -0,0 +1,178 @@
+import hashlib
+import logging
+import zipfile
+from urllib.parse import quote
+
+logger = logging.getLogger(__name__)
+
+# 读取缓冲区大小
+BUFFER_SIZE = 64 * 1024
+
+# 超过该长度的字符串只做流式跳过（如 pieces），不读入内存
+MAX_STRING = 4096
+
+# 允许的最大嵌套深度
+MAX_DEPTH = 64
+
+class TorrentError(ValueError):
+    pass
+
+# 带缓冲的读取器：tap 不为空时，读取或跳过的原始字节都会送入 tap（用于计算 info 的哈希）
+class _Reader:
+    def __init__(self, f):
+        self.f = f
+        self.buffer = b""
+        self.pos = 0
+        self.tap = None
+
+    def _fill(self):
+        if self.pos >= len(self.buffer):
+            self.buffer = self.f.read(BUFFER_SIZE)
+            self.pos = 0
+            if not self.buffer:
+                raise TorrentError("种子文件不完整")
+
+    def peek(self):
+        self._fill()
+        return self.buffer[self.pos:self.pos + 1]
+
+    def _consume(self, n):
+        data = self.buffer[self.pos:self.pos + n]
+        self.pos += n
+        if self.tap is not None:
+            self.tap.update(data)
+        return data
+
+    # 读取 n 个字节
+    def read(self, n):
+        parts = []
+        while n > 0:
+            self._fill()
+            data = self._consume(min(n, len(self.buffer) - self.pos))
+            parts.append(data)
+            n -= len(data)
+        return b"".join(parts)
+
+    # 跳过 n 个字节，不保留内容
+    def skip(self, n):
+        while n > 0:
+            self._fill()
+            n -= len(self._consume(min(n, len(self.buffer) - self.pos)))
+
+    # 读取到 terminator 为止的数字
+    def read_number(self, terminator):
+        digits = b""
+        while True:
+            char = self.read(1)
+            if char == terminator:
+                break
+            if not (char.isdigit() or (char == b"-" and not digits)) or len(digits) > 20:
+                raise TorrentError("种子文件格式错误")
+            digits += char
+        if not digits or digits == b"-":
+            raise TorrentError("种子文件格式错误")
+        return int(digits)
+
+def _read_string(reader):
+    length = reader.read_number(b":")
+    if length > MAX_STRING:
+        reader.skip(length)
+        return None
+    return reader.read(length)
+
+# 跳过一个值，不构造对象
+def _skip_value(reader, depth=0):
+    if depth > MAX_DEPTH:
+        raise TorrentError("种子文件嵌套过深")
+    token = reader.peek()
+    if token == b"i":
+        reader.read(1)
+        reader.read_number(b"e")
+    elif token in (b"l", b"d"):
+        reader.read(1)
+        while reader.peek() != b"e":
+            _skip_value(reader, depth + 1)
+        reader.read(1)
+    elif token.isdigit():
+        reader.skip(reader.read_number(b":"))
+    else:
+        raise TorrentError("种子文件格式错误")
+
+# 读取一个短字符串值，其他类型的值直接跳过
+def _read_text_value(reader):
+    if reader.peek().isdigit():
+        value = _read_string(reader)
+        return value.decode("utf-8", "replace") if value is not None else None
+    _skip_value(reader, 1)
+    return None
+
+# 扫描 info 字典：边读边计算 SHA-1，只取出 name，pieces 等大字段直接流过
+def _scan_info(reader):
+    if reader.peek() != b"d":
+        raise TorrentError("种子文件缺少 info 字典")
+    digest = hashlib.sha1()
+    reader.tap = digest
+    name = None
+    reader.read(1)
+    while reader.peek() != b"e":
+        key = _read_string(reader)
+        if key == b"name":
+            name = _read_text_value(reader)
+        else:
+            _skip_value(reader, 1)
+    reader.read(1)
+    reader.tap = None
+    return digest.hexdigest(), name
+
+# 流式解析种子文件，返回 (info_hash, 名称, tracker)
+def parse_torrent(f):
+    reader = _Reader(f)
+    if reader.read(1) != b"d":
+        raise TorrentError("不是有效的种子文件")
+    info_hash = name = tracker = None
+    while reader.peek() != b"e":
+        key = _read_string(reader)
+        if key == b"info":
+            info_hash, name = _scan_info(reader)
+        elif key == b"announce":
+            tracker = _read_text_value(reader)
+        else:
+            _skip_value(reader, 1)
+    if info_hash is None:
+        raise TorrentError("种子文件缺少 info 字典")
+    return info_hash, name, tracker
+
+# 由 info_hash 生成磁力链接
+def make_magnet(info_hash, name=None, tracker=None):
+    magnet = f"magnet:?xt=urn:btih:{info_hash}"
+    if name:
+        magnet += f"&dn={quote(name)}"
+    if tracker:
+        magnet += f"&tr={quote(tracker, safe='')}"
+    return magnet
+
+# 逐个打开路径中的种子：.torrent 文件本身，或 .zip 压缩包中的所有 .torrent 文件
+def _iter_torrent_files(path, file_name):
+    if file_name.lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(".torrent"):
+                    with archive.open(info) as f:
+                        yield info.filename, f
+    else:
+        with open(path, "rb") as f:
+            yield file_name, f
+
+# 从种子文件或种子压缩包中逐个产出磁力链接，按 info_hash 去重，无法解析的种子会被跳过
+def iter_torrent_magnets(path, file_name):
+    seen = set()
+    for member, f in _iter_torrent_files(path, file_name):
+        try:
+            info_hash, name, tracker = parse_torrent(f)
+        except TorrentError as e:
+            logger.warning("跳过无法解析的种子 %s: %s", member, e)
+            continue
+        if info_hash in seen:
+            continue
+        seen.add(info_hash)
+        yield make_magnet(info_hash, name, tracker)
@@ -0,0 +1,182 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# 慢更新的默认阈值（秒）
+DEFAULT_SLOW_THRESHOLD = 5.0
+
+# 慢更新记录的默认输出目录
+DEFAULT_DUMP_DIR = 'traces'
+
+# 栈采样的默认间隔（秒）
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# 追踪设置，由 configure() 在启动时根据配置中的 tracing 项设置
+_settings = {"enabled": False, "slow_threshold": DEFAULT_SLOW_THRESHOLD, "dump_dir": DEFAULT_DUMP_DIR,
+             "profile": None, "sample_interval": DEFAULT_SAMPLE_INTERVAL}
+
+# 当前更新的追踪记录，随 asyncio 任务上下文传递
+_current = contextvars.ContextVar('trace', default=None)
+
+# cProfile 同一线程只能有一个在运行
+_profiling = threading.Lock()
+
+# 根据配置中的 tracing 项设置追踪选项
+def configure(settings):
+    _settings["enabled"] = bool(settings.get('enabled'))
+    _settings["slow_threshold"] = float(settings.get('slow_threshold', DEFAULT_SLOW_THRESHOLD))
+    _settings["dump_dir"] = settings.get('dump_dir', DEFAULT_DUMP_DIR)
+    _settings["profile"] = settings.get('profile') or None
+    _settings["sample_interval"] = float(settings.get('sample_interval', DEFAULT_SAMPLE_INTERVAL))
+
+# 一次更新的追踪记录：spans 为 [(阶段, 相对开始时间, 耗时, 附加信息)]
+class Trace:
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def to_dict(self, elapsed):
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            "elapsed": elapsed,
+            "spans": [
+                {"name": name, "offset": round(offset, 6), "duration": round(duration, 6), **attrs}
+                for name, offset, duration, attrs in sorted(self.spans, key=lambda span: span[1])
+            ],
+        }
+
+    # 按阶段汇总耗时，用于日志输出
+    def summary(self):
+        totals = {}
+        for name, _, duration, _ in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return ', '.join(f"{name}={duration:.3f}s" for name, duration in sorted(totals.items(), key=lambda item: -item[1]))
+
+# 记录一个处理阶段，未在追踪中的调用不做任何事
+@contextmanager
+def span(name, **attrs):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append((name, start - trace.start, time.perf_counter() - start, attrs))
+
+# 栈采样器：在后台线程定期采样目标线程的调用栈，输出折叠栈格式（可用于火焰图）
+class StackSampler:
+    def __init__(self, thread_id, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+# 启动配置的分析器，返回 (类型, 分析器)；cProfile 已被占用时不分析
+def _start_profiler():
+    mode = _settings["profile"]
+    if mode == 'cprofile':
+        if not _profiling.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            _profiling.release()
+            return None
+        return mode, profiler
+    if mode == 'sample':
+        sampler = StackSampler(threading.get_ident(), _settings["sample_interval"])
+        sampler.start()
+        return mode, sampler
+    return None
+
+def _stop_profiler(profiler):
+    mode, instance = profiler
+    if mode == 'cprofile':
+        instance.disable()
+        _profiling.release()
+    else:
+        instance.stop()
+
+# 将慢更新的追踪记录和分析结果写入输出目录
+def _dump(trace, elapsed, profiler):
+    directory = _settings["dump_dir"]
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(trace.started_at))
+    base = os.path.join(directory, f"{stamp}-{trace.name}-{int(elapsed * 1000)}ms")
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(trace.to_dict(elapsed), f, indent=2, ensure_ascii=False, default=str)
+    if profiler is not None:
+        mode, instance = profiler
+        if mode == 'cprofile':
+            instance.dump_stats(base + '.prof')
+        else:
+            instance.dump(base + '.stacks.txt')
+    return base
+
+# 追踪装饰器：为一次更新建立追踪记录，耗时超过阈值时输出各阶段耗时并写入输出目录
+def traced(name):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not _settings["enabled"] or _current.get() is not None:
+                return await func(*args, **kwargs)
+
+            trace = Trace(name)
+            token = _current.set(trace)
+            profiler = _start_profiler()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - trace.start
+                if profiler is not None:
+                    _stop_profiler(profiler)
+                _current.reset(token)
+                if elapsed >= _settings["slow_threshold"]:
+                    try:
+                        path = _dump(trace, elapsed, profiler)
+                        logger.warning("慢更新 %s 耗时 %.3fs (%s)，详情: %s.json", name, elapsed, trace.summary(), path)
+                    except OSError as e:
+                        logger.warning("写入追踪记录失败: %s", e)
+        return wrapper
+    return decorator